@@ -0,0 +1,129 @@
+"""Checkpoints of leaf values in one contiguous array file.
+
+Values of the leaves are stored as a single record of a .npy file. Its
+structured dtype has one float64 field per leaf name, holding the offset
+and shape of the leaf's values, so data and index live in one file. The
+file is replaced atomically, so a checkpoint being read or mapped stays
+intact while a new one is written.
+"""
+import os
+import threading
+from typing import Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from autodiff.graph import VAL, Var
+
+
+def leaves(root: Var, names: Optional[Iterable[str]] = None) -> List[Var]:
+    """Return leaves of the graph which take grads, only given names if any."""
+    wanted = None if names is None else set(names)
+    return [
+        node
+        for node in root.order()
+        if node.opcode == VAL
+        and node.requires_grad
+        and (wanted is None or node.name in wanted)
+    ]
+
+
+def save(path: str, params: Sequence[Var]):
+    """Write current values of given leaves to a checkpoint at path."""
+    fields: List[Tuple[str, str, Tuple[int, ...]]] = []
+    values = []
+    for param in params:
+        if not param.name:
+            raise ValueError("leaves of a checkpoint need names")
+        if param.name in (field[0] for field in fields):
+            raise ValueError(f"duplicate leaf name: {param.name}")
+        val = np.asarray(param.eval_value, dtype=float)
+        fields.append((param.name, "<f8", val.shape))
+        values.append(val)
+    data = np.zeros(1, dtype=np.dtype(fields))
+    for (name, _, _), val in zip(fields, values):
+        data[name][0] = val
+    with open(path + ".tmp", "wb") as file:
+        np.save(file, data)
+    os.replace(path + ".tmp", path)
+
+
+def restore(path: str, params: Sequence[Var], mmap: bool = True):
+    """Assign values from the checkpoint at path to given leaves.
+
+    With mmap the file is memory-mapped and array leaves get read-only views
+    of it, so nothing is copied until values are updated.
+    """
+    data = np.load(path, mmap_mode="r" if mmap else None)
+    for param in params:
+        if data.dtype.fields is None or param.name not in data.dtype.fields:
+            raise KeyError(f"leaf {param.name} is not in checkpoint {path}")
+        val = data[param.name][0]
+        param.assign(val if isinstance(val, np.ndarray) else float(val))
+
+
+class Checkpointer:  # pylint: disable=too-many-instance-attributes
+    """Save checkpoints of given leaves periodically on a background thread.
+
+    Leaves get new values through assign, which replaces values instead of
+    updating them, so the thread can read them while training continues.
+    """
+
+    def __init__(self, path: str, params: Sequence[Var], interval: float = 60.0):
+        """Initialize checkpointer, call start to begin saving."""
+        self.path = path
+        self.params = list(params)
+        self.interval = interval
+        self.saved = 0
+        self.error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def save(self):
+        """Save a checkpoint now."""
+        with self._lock:
+            save(self.path, self.params)
+            self.saved += 1
+
+    def _run(self):
+        """Save checkpoints until stopped."""
+        while not self._stop.wait(self.interval):
+            try:
+                self.save()
+            except Exception as error:  # pylint: disable=broad-except
+                self.error = error
+
+    def start(self):
+        """Start saving checkpoints every interval seconds."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, final: bool = True):
+        """Stop the background thread, saving a last checkpoint if final.
+
+        The last error of a background save, if any, is raised.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        if final:
+            self.save()
+
+    def __enter__(self) -> "Checkpointer":
+        """Start saving checkpoints."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, *args):
+        """Stop saving checkpoints, saving a last one.
+
+        Errors of saving are not raised over an error leaving the block.
+        """
+        try:
+            self.stop()
+        except Exception:  # pylint: disable=broad-except
+            if exc_type is None:
+                raise
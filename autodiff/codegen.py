@@ -0,0 +1,170 @@
+"""Generation of straight-line Python functions from a graph."""
+import keyword
+import math
+import re
+from typing import Any, Callable, Dict, List, Sequence, Set, Tuple
+from autodiff.graph import ADD, CONST, DIV, MULT, NEG, POW, STOP, SUB, VAL, Var
+
+CacheKey = Tuple[Var, Tuple[Var, ...], Tuple[Var, ...]]
+
+# Generated functions by (root, inputs, wrt), with the order they were made from.
+_CACHE: Dict[CacheKey, Tuple[List[Var], Callable]] = {}
+CACHE_SIZE = 128
+
+# Names of generated locals and arguments, not usable as leaf names.
+_RESERVED = re.compile(r"[vda]\d+")
+
+_FORMULAS = {
+    ADD: "{0} + {1}",
+    SUB: "{0} - {1}",
+    MULT: "{0} * {1}",
+    DIV: "{0} / {1}",
+    POW: "{0} ** {1}",
+    NEG: "-{0}",
+    STOP: "{0}",
+}
+
+
+def _argument_names(inputs: Sequence[Var]) -> List[str]:
+    """Return parameter names for inputs, their own names when usable.
+
+    Names clashing with generated locals or names of the namespace, which
+    start with an underscore, become a<position>.
+    """
+    names: List[str] = []
+    for idx, node in enumerate(inputs):
+        name = node.name
+        if (
+            not name.isidentifier()
+            or keyword.iskeyword(name)
+            or name.startswith("_")
+            or _RESERVED.fullmatch(name)
+            or name in names
+        ):
+            name = f"a{idx}"
+        names.append(name)
+    return names
+
+
+def _literal(val: float) -> str:
+    """Return expression of a number, naming values without a literal."""
+    if math.isnan(val):
+        return "_nan"
+    if math.isinf(val):
+        return "_inf" if val > 0.0 else "-_inf"
+    return repr(val)
+
+
+def free_leaves(root: Var, inputs: Sequence[Var]) -> List[Var]:
+    """Return leaves of the graph not in inputs, in the order source reads them."""
+    args = set(inputs)
+    return [node for node in root.order() if node.opcode == VAL and node not in args]
+
+
+def _active(nodes: List[Var], wrt: Sequence[Var]) -> Set[Var]:
+    """Return nodes which depend on any of the nodes in wrt through grads."""
+    active = set(wrt)
+    for node in nodes:
+        if node.opcode != STOP and any(child in active for child in node.children):
+            active.add(node)
+    return active
+
+
+def _contributions(
+    node: Var, left: str, right: str, val: str, adj: str
+) -> List[str]:
+    """Return adjoint contributions of node to its children as expressions."""
+    code = node.opcode
+    if code == ADD:
+        return [adj, adj]
+    if code == SUB:
+        return [adj, f"-{adj}"]
+    if code == MULT:
+        return [f"{adj} * {right}", f"{adj} * {left}"]
+    if code == DIV:
+        return [f"{adj} / {right}", f"-{adj} * {left} / ({right} * {right})"]
+    if code == POW:
+        return [
+            f"{adj} * {right} * {left} ** ({right} - 1)",
+            f"({adj} * {val} * _log({left}) if {left} > 0.0 else _nan)",
+        ]
+    return [f"-{adj}"]
+
+
+def source(
+    root: Var, inputs: Sequence[Var], wrt: Sequence[Var], name: str = "f"
+) -> str:
+    """Return source of a function evaluating root and its gradient.
+
+    The function takes values of inputs as arguments and returns a tuple of
+    the root value followed by its gradient for each node in wrt. Constants
+    are inlined. Other leaves, see free_leaves, are read when called from
+    the nodes in _leaves, which the namespace of the function must provide.
+    """
+    nodes = root.order()
+    index = {node: idx for idx, node in enumerate(nodes)}
+    args = dict(zip(inputs, _argument_names(inputs)))
+    free = {node: pos for pos, node in enumerate(free_leaves(root, inputs))}
+    lines = [f"def {name}({', '.join(args[node] for node in inputs)}):"]
+    for idx, node in enumerate(nodes):
+        if node in args:
+            lines.append(f"    v{idx} = {args[node]}")
+        elif node in free:
+            lines.append(f"    v{idx} = _leaves[{free[node]}].eval_value")
+        elif node.opcode == CONST:
+            lines.append(f"    v{idx} = {_literal(float(node.eval_value))}")
+        elif node.opcode in _FORMULAS:
+            operands = [f"v{index[child]}" for child in node.children]
+            lines.append(f"    v{idx} = {_FORMULAS[node.opcode].format(*operands)}")
+        else:
+            raise ValueError(f"operator {node.name} can not be generated")
+    active = _active(nodes, wrt)
+    pending: Dict[Var, List[str]] = {node: [] for node in nodes}
+    pending[root].append("1.0")
+    for node in reversed(nodes):
+        if node not in active:
+            continue
+        idx = index[node]
+        lines.append(f"    d{idx} = {' + '.join(pending[node]) or '0.0'}")
+        if not node.children:
+            continue
+        operands = [f"v{index[child]}" for child in node.children]
+        contribs = _contributions(
+            node, operands[0], operands[-1], f"v{idx}", f"d{idx}"
+        )
+        for child, contrib in zip(node.children, contribs):
+            if child in active:
+                pending[child].append(contrib)
+    results = [f"v{index[root]}"] + [
+        f"d{index[node]}" if node in active and node in index else "0.0"
+        for node in wrt
+    ]
+    lines.append(f"    return ({', '.join(results)},)")
+    return "\n".join(lines) + "\n"
+
+
+def generate(root: Var, inputs: Sequence[Var], wrt: Sequence[Var]) -> Callable:
+    """Return cached function evaluating root and its gradient, see source.
+
+    A function is generated again when the graph changed since it was made,
+    leaves not in inputs are read when it is called.
+    """
+    key = (root, tuple(inputs), tuple(wrt))
+    nodes = root.order()
+    cached = _CACHE.get(key)
+    if cached is not None and cached[0] is nodes:
+        return cached[1]
+    text = source(root, inputs, wrt)
+    namespace: Dict[str, Any] = {
+        "_log": math.log,
+        "_nan": math.nan,
+        "_inf": math.inf,
+        "_leaves": free_leaves(root, inputs),
+    }
+    exec(compile(text, "<autodiff>", "exec"), namespace)  # nosec # pylint: disable=exec-used
+    func = namespace["f"]
+    func.source = text
+    if len(_CACHE) >= CACHE_SIZE:
+        del _CACHE[next(iter(_CACHE))]
+    _CACHE[key] = (nodes, func)
+    return func
@@ -0,0 +1,189 @@
+"""Streaming minibatches of numeric data files.
+
+Readers parse files in chunks of rows into arrays, the stages below work on
+iterators of such chunks and end with feeds for batched evaluation:
+
+    feeds(batches(shuffle(read_csv(path), 4096), 32), [x, y])
+
+minibatches chains them all and prefetches on a background thread.
+"""
+from itertools import islice
+import queue
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+import numpy as np
+from autodiff.graph import Var
+
+
+def _read(
+    path: str, chunk_size: int, delimiter: Optional[str], skip: int
+) -> Iterator[np.ndarray]:
+    """Yield arrays of rows parsed from chunk_size lines at a time."""
+    with open(path, encoding="utf-8") as file:
+        for _ in islice(file, skip):
+            pass
+        while True:
+            lines = [line for line in islice(file, chunk_size) if line.strip()]
+            if not lines:
+                return
+            yield np.loadtxt(lines, delimiter=delimiter, ndmin=2)
+
+
+def read_csv(
+    path: str, chunk_size: int = 1024, delimiter: str = ",", header: bool = False
+) -> Iterator[np.ndarray]:
+    """Yield chunks of rows of a csv file, skipping its header line if any."""
+    return _read(path, chunk_size, delimiter, 1 if header else 0)
+
+
+def read_lines(path: str, chunk_size: int = 1024) -> Iterator[np.ndarray]:
+    """Yield chunks of rows of a file with whitespace separated numbers per line."""
+    return _read(path, chunk_size, None, 0)
+
+
+def shuffle(
+    chunks: Iterable[np.ndarray], buffer_size: int, seed: Optional[int] = None
+) -> Iterator[np.ndarray]:
+    """Yield rows of chunks shuffled within a buffer of buffer_size rows."""
+    rng = np.random.default_rng(seed)
+    buffer: Optional[np.ndarray] = None
+    for chunk in chunks:
+        buffer = chunk if buffer is None else np.concatenate([buffer, chunk])
+        excess = len(buffer) - buffer_size
+        if excess > 0:
+            buffer = buffer[rng.permutation(len(buffer))]
+            yield buffer[:excess]
+            buffer = buffer[excess:]
+    if buffer is not None and len(buffer):
+        yield buffer[rng.permutation(len(buffer))]
+
+
+def batches(
+    chunks: Iterable[np.ndarray], batch_size: int, drop_last: bool = False
+) -> Iterator[np.ndarray]:
+    """Yield rows of chunks regrouped in batches of batch_size rows.
+
+    The last batch is smaller when rows run out, unless dropped.
+    """
+    pending: List[np.ndarray] = []
+    count = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        count += len(chunk)
+        if count < batch_size:
+            continue
+        rows = np.concatenate(pending)
+        end = len(rows) - len(rows) % batch_size
+        for start in range(0, end, batch_size):
+            yield rows[start:start + batch_size]
+        pending = [rows[end:]]
+        count = len(rows) - end
+    if count and not drop_last:
+        yield np.concatenate(pending)
+
+
+def feeds(
+    chunks: Iterable[np.ndarray], inputs: Sequence[Var]
+) -> Iterator[Dict[Var, np.ndarray]]:
+    """Yield feeds mapping each input to its column of the batch."""
+    for chunk in chunks:
+        if chunk.shape[1] != len(inputs):
+            raise ValueError(
+                f"rows have {chunk.shape[1]} columns for {len(inputs)} inputs"
+            )
+        yield {
+            leaf: np.ascontiguousarray(chunk[:, idx])
+            for idx, leaf in enumerate(inputs)
+        }
+
+
+class Prefetcher:
+    """Iterate items produced ahead of time by a background thread.
+
+    Up to size items are kept ready. An error raised by the source is
+    raised again where its item would have been returned.
+    """
+
+    _DONE = object()
+
+    def __init__(self, items: Iterable, size: int = 2):
+        """Initialize prefetcher and start its thread."""
+        self._queue: queue.Queue = queue.Queue(maxsize=size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(items,), daemon=True
+        )
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        """Queue item unless stopped, return whether it was queued."""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self, items: Iterable):
+        """Produce items until the source is exhausted or stopped."""
+        try:
+            for item in items:
+                if not self._put(item):
+                    return
+        except Exception as error:  # pylint: disable=broad-except
+            self._put(error)
+            return
+        self._put(self._DONE)
+
+    def __iter__(self) -> "Prefetcher":
+        """Return the prefetcher."""
+        return self
+
+    def __next__(self):
+        """Return the next item."""
+        if not self._thread.is_alive() and self._queue.empty():
+            raise StopIteration
+        item = self._queue.get()
+        if item is self._DONE:
+            self._queue.put(item)
+            raise StopIteration
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def close(self):
+        """Stop the background thread."""
+        self._stop.set()
+        self._thread.join()
+
+    def __enter__(self) -> "Prefetcher":
+        """Return the prefetcher."""
+        return self
+
+    def __exit__(self, *args):
+        """Stop the background thread."""
+        self.close()
+
+
+def minibatches(  # pylint: disable=too-many-arguments
+    path: str,
+    inputs: Sequence[Var],
+    batch_size: int,
+    buffer_size: int = 0,
+    prefetch: int = 2,
+    header: bool = False,
+    seed: Optional[int] = None,
+) -> Prefetcher:
+    """Return prefetched feeds of minibatches of a data file, one column per input.
+
+    Files ending in .csv are read as csv, others as whitespace separated.
+    Rows are shuffled within buffer_size rows when it is positive.
+    """
+    if path.endswith(".csv"):
+        chunks = read_csv(path, header=header)
+    else:
+        chunks = read_lines(path)
+    if buffer_size > 0:
+        chunks = shuffle(chunks, buffer_size, seed)
+    return Prefetcher(feeds(batches(chunks, batch_size), inputs), prefetch)
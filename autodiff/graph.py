@@ -1,193 +1,304 @@
 """Graph related types."""
 from collections import deque
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from functools import lru_cache
 import math
-from typing import Deque, Iterable, List, Union, cast, Tuple, get_args
+from typing import (
+    Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Union, cast, Tuple,
+    get_args
+)
 from wsgiref.validate import PartialIteratorWrapper
+import numpy as np
 
 Number = Union[float, int]
 NodeType = Union[float, int, "Var"]
+Axis = Union[None, int, Tuple[int, ...]]
+Feed = Dict["Var", Union[float, int, Sequence[float], np.ndarray]]
+
+# Operator codes, shared by Op subclasses and flat representations of a graph.
+VAL, ADD, SUB, NEG, MULT, POW, DIV, MATMUL, SUM, MEAN, MAX, CONST, STOP = range(13)
+
+# Operators which never require grad.
+NO_GRAD = (CONST, STOP)
+
+# Operators whose operands can be swapped.
+COMMUTATIVE = (ADD, MULT)
+
+# Operators which combine elements, so samples along an axis interact.
+REDUCING = (MATMUL, SUM, MEAN, MAX)
+
+# Number of wrt sequences whose active nodes are kept per root.
+ACTIVE_CACHE_SIZE = 8
+
+# Number of distinct literals kept by Var.resolve.
+LITERAL_CACHE_SIZE = 1024
+
+# Nodes by structure while inside interning(), None otherwise.
+_INTERNED: Optional[Dict[tuple, "Var"]] = None
+
+# Shared initial value of node fields, avoids a float allocation per field.
+NAN = float("nan")
 
 def close(left, right) -> bool:
     """Match 6 digits."""
     return math.isclose(left, right, abs_tol=0.0000009)
 
+
+def unbroadcast(grad: np.ndarray, shape: Tuple[int, ...]) -> np.ndarray:
+    """Sum grad over the axes NumPy broadcasting added to a value of given shape."""
+    if grad.shape == shape:
+        return grad
+    if grad.ndim > len(shape):
+        grad = grad.sum(axis=tuple(range(grad.ndim - len(shape))))
+    axes = tuple(
+        idx for idx, dim in enumerate(shape) if dim == 1 and grad.shape[idx] != 1
+    )
+    if axes:
+        grad = grad.sum(axis=axes, keepdims=True)
+    return grad
+
+
+def log(val):
+    """Return natural logarithm of a number or elementwise of an array."""
+    if isinstance(val, np.ndarray):
+        return np.log(val)
+    return math.log(val, math.e)
+
+
+def is_zero(val) -> bool:
+    """Match 6 digits against zero, for a number or every element of an array."""
+    if isinstance(val, np.ndarray):
+        return bool(np.all(np.abs(val) <= 0.0000009))
+    return close(val, 0.0)
+
 class Op(ABC):
-    """Operator in a graph."""
+    """Operator in a graph.
 
-    def __init__(self, var: "Var"):
-        """Initialize operator with graph node."""
-        self.var = var
+    Operators are stateless, a single instance per opcode is shared by every
+    node and receives the node it works on.
+    """
+
+    code: int
 
     @abstractmethod
-    def eval(self):
+    def eval(self, var: "Var"):
         """Evaluate the value of the operator."""
 
     @abstractmethod
-    def forward(self, wrt: "Var"):  # pylint: disable:invalid-name
+    def forward(self, var: "Var", wrt: Optional["Var"]):  # pylint: disable:invalid-name
         """Calculate forward gradient with respect to given variable."""
 
-    def backward(self, root: bool = False):
-        """Calculate adjoint if not root. Set adjoint to 1.0 otherwise."""
+    def backward(self, var: "Var", root: bool = False):
+        """Calculate adjoint if not root. Set adjoint to 1.0 otherwise.
+
+        An array valued root gets 1.0 for each of its elements.
+        """
         if root:
-            self.var.adjoint_value = 1.0
+            var.adjoint_value = (
+                np.ones_like(var.eval_value)
+                if isinstance(var.eval_value, np.ndarray) else 1.0
+            )
         else:
-            self._backward()
+            self._backward(var)
 
     @abstractmethod
-    def _backward(self):
+    def _backward(self, var: "Var"):
         """Calculate adjoint of the node."""
 
-    def accum_grad(self, contrib: float):
-        """Accumulate grad value."""
-        self.var.adjoint_value += contrib
+    def accum_grad(self, var: "Var", contrib: float):
+        """Accumulate grad value of given node.
 
-    def print(self, prefix: str = ""):
+        Array contributions are summed down to the shape of the node's value,
+        nodes not requiring grad take no contributions.
+        """
+        if not var.requires_grad:
+            return
+        if isinstance(contrib, np.ndarray):
+            contrib = unbroadcast(contrib, np.shape(var.eval_value))
+        var.adjoint_value += contrib
+
+    def print(self, var: "Var", prefix: str = ""):
         """Print operator detail."""
         print(
-            prefix + f"{self.var.name}| "
-            f"val={self.var.eval_value} grad={self.var.adjoint_value} "
-            f"forward={self.var.forward_value}"
+            prefix + f"{var.name}| "
+            f"val={var.eval_value} grad={var.adjoint_value} "
+            f"forward={var.forward_value}"
         )
-        for child in self.var.children:
+        for child in var.children:
             child.print(prefix + "   ")
 
 
 class Val(Op):
     """Constant operator."""
 
-    def eval(self):
+    code = VAL
+
+    def eval(self, var: "Var"):
         """Return value of the variable."""
 
-    def forward(self, wrt: "Var"):
+    def forward(self, var: "Var", wrt: Optional["Var"]):
         """Calculate grade of a constant."""
-        if id(self.var) == id(wrt):
-            self.var.forward_value = 1.0
+        if id(var) == id(wrt):
+            var.forward_value = 1.0
         else:
-            self.var.forward_value = 0.0
+            var.forward_value = 0.0
 
-    def _backward(self):
+    def _backward(self, var: "Var"):
         """No children so nothing much to do."""
 
 
+class Const(Val):
+    """Literal constant operator, never has a tangent nor takes an adjoint."""
+
+    code = CONST
+
+    def forward(self, var: "Var", wrt: Optional["Var"]):
+        """Constant has no tangent."""
+        var.forward_value = 0.0
+
+
 class Add(Op):
     """Add operator."""
 
-    def eval(self):
+    code = ADD
+
+    def eval(self, var: "Var"):
         """Return result of addition."""
-        self.var.eval_value = (
-            self.var.children[0].eval_value + self.var.children[1].eval_value
+        var.eval_value = (
+            var.children[0].eval_value + var.children[1].eval_value
         )
 
-    def forward(self, wrt: "Var"):
+    def forward(self, var: "Var", wrt: Optional["Var"]):
         """Calculate grad of addition."""
-        self.var.forward_value = (
-            self.var.children[0].forward_value + self.var.children[1].forward_value
+        var.forward_value = (
+            var.children[0].forward_value + var.children[1].forward_value
         )
 
-    def _backward(self):
+    def _backward(self, var: "Var"):
         """Progagate grad values to children of add operator."""
-        self.var.children[0].op.accum_grad(self.var.adjoint_value)
-        self.var.children[1].op.accum_grad(self.var.adjoint_value)
+        self.accum_grad(var.children[0], var.adjoint_value)
+        self.accum_grad(var.children[1], var.adjoint_value)
 
 
 class Sub(Op):
     """Subtract operator."""
 
-    def eval(self):
+    code = SUB
+
+    def eval(self, var: "Var"):
         """Return result of subtraction."""
-        self.var.eval_value = (
-            self.var.children[0].eval_value - self.var.children[1].eval_value
+        var.eval_value = (
+            var.children[0].eval_value - var.children[1].eval_value
         )
 
-    def forward(self, wrt: "Var"):
+    def forward(self, var: "Var", wrt: Optional["Var"]):
         """Calculate grad of subtraction."""
-        self.var.forward_value = (
-            self.var.children[0].forward_value - self.var.children[1].forward_value
+        var.forward_value = (
+            var.children[0].forward_value - var.children[1].forward_value
         )
 
-    def _backward(self):
+    def _backward(self, var: "Var"):
         """Progagate grad values to children of subtract operator."""
-        self.var.children[0].op.accum_grad(self.var.adjoint_value)
-        self.var.children[1].op.accum_grad(-self.var.adjoint_value)
+        self.accum_grad(var.children[0], var.adjoint_value)
+        self.accum_grad(var.children[1], -var.adjoint_value)
 
 
 class Neg(Op):
     """Negation operator."""
 
-    def eval(self):
+    code = NEG
+
+    def eval(self, var: "Var"):
         """Return result of negation."""
-        self.var.eval_value = -self.var.children[0].eval_value
+        var.eval_value = -var.children[0].eval_value
 
-    def forward(self, wrt: "Var"):
+    def forward(self, var: "Var", wrt: Optional["Var"]):
         """Calculate grad of negation."""
-        self.var.forward_value = -self.var.children[0].forward_value
+        var.forward_value = -var.children[0].forward_value
 
-    def _backward(self):
+    def _backward(self, var: "Var"):
         """Progagate grad values to children of negation operator."""
-        self.var.children[0].op.accum_grad(-self.var.adjoint_value)
+        self.accum_grad(var.children[0], -var.adjoint_value)
 
 class Mult(Op):
     """Multiply operator."""
 
-    def eval(self):
+    code = MULT
+
+    def eval(self, var: "Var"):
         """Return result of multiplication."""
-        self.var.eval_value = (
-            self.var.children[0].eval_value * self.var.children[1].eval_value
+        var.eval_value = (
+            var.children[0].eval_value * var.children[1].eval_value
         )
 
-    def forward(self, wrt: "Var"):
+    def forward(self, var: "Var", wrt: Optional["Var"]):
         """Calculate grad of multiplication."""
-        self.var.forward_value = (
-            self.var.children[0].forward_value * self.var.children[1].eval_value
-            + self.var.children[0].eval_value * self.var.children[1].forward_value
+        var.forward_value = (
+            var.children[0].forward_value * var.children[1].eval_value
+            + var.children[0].eval_value * var.children[1].forward_value
         )
 
-    def _backward(self):
+    def _backward(self, var: "Var"):
         """Progagate grad values to children of multiply operator."""
-        self.var.children[0].op.accum_grad(
-            self.var.adjoint_value * self.var.children[1].eval_value
+        self.accum_grad(
+            var.children[0], var.adjoint_value * var.children[1].eval_value
         )
-        self.var.children[1].op.accum_grad(
-            self.var.adjoint_value * self.var.children[0].eval_value
+        self.accum_grad(
+            var.children[1], var.adjoint_value * var.children[0].eval_value
         )
 
 class Pow(Op):
     """Power operator. Only allows constant values as power."""
 
-    def eval(self):
+    code = POW
+
+    def eval(self, var: "Var"):
         """Return result of power."""
-        self.var.eval_value = (
-            self.var.children[0].eval_value ** self.var.children[1].eval_value
+        var.eval_value = (
+            var.children[0].eval_value ** var.children[1].eval_value
         )
 
-    def forward(self, wrt: "Var"):
+    def forward(self, var: "Var", wrt: Optional["Var"]):
         """Calculate grad of multiplication."""
-        val = self.var.eval_value
-        power_val = self.var.children[1].eval_value
-        quotient_val = self.var.children[0].eval_value
-        power_d = self.var.children[1].forward_value
-        quotient_d = self.var.children[0].forward_value
-        self.var.forward_value = (
+        val = var.eval_value
+        power_val = var.children[1].eval_value
+        quotient_val = var.children[0].eval_value
+        power_d = var.children[1].forward_value
+        quotient_d = var.children[0].forward_value
+        var.forward_value = (
             power_val * (quotient_val ** (power_val-1)) * quotient_d
-        ) if close(power_d, 0.0) else (
+        ) if is_zero(power_d) else (
             val * (
-                power_d * math.log(quotient_val, math.e)
+                power_d * log(quotient_val)
                 + (power_val * quotient_d / quotient_val)
             )
         )
 
 
-    def _backward(self):
+    def _backward(self, var: "Var"):
         """Progagate grad values to children of multiply operator."""
-        val = self.var.eval_value
-        val_d = self.var.adjoint_value
-        power_val = self.var.children[1].eval_value
-        quotient_val = self.var.children[0].eval_value
-        self.var.children[0].op.accum_grad(
+        val = var.eval_value
+        val_d = var.adjoint_value
+        power_val = var.children[1].eval_value
+        quotient_val = var.children[0].eval_value
+        self.accum_grad(
+            var.children[0],
             val_d * (power_val) * (quotient_val ** (power_val-1))
         )
-        self.var.children[1].op.accum_grad(
+        if not var.children[1].requires_grad:
+            return
+        if isinstance(quotient_val, np.ndarray):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                self.accum_grad(
+                    var.children[1],
+                    np.where(
+                        quotient_val > 0.0, val_d * val * np.log(quotient_val), NAN
+                    )
+                )
+            return
+        self.accum_grad(
+            var.children[1],
             (
                 float('nan')
             ) if quotient_val <= 0.0 else (
@@ -199,117 +310,446 @@ class Pow(Op):
 class Div(Op):
     """Division operator."""
 
-    def eval(self):
+    code = DIV
+
+    def eval(self, var: "Var"):
         """Return result of division."""
-        left_val = self.var.children[0].eval_value
-        right_val = self.var.children[1].eval_value
-        self.var.eval_value = left_val / right_val
+        left_val = var.children[0].eval_value
+        right_val = var.children[1].eval_value
+        var.eval_value = left_val / right_val
 
-    def forward(self, wrt: "Var"):
+    def forward(self, var: "Var", wrt: Optional["Var"]):
         """Calculate grad of division."""
-        left_val = self.var.children[0].eval_value
-        left_d = self.var.children[0].forward_value
-        right_val = self.var.children[1].eval_value
-        right_d = self.var.children[1].forward_value
-        self.var.forward_value = (
+        left_val = var.children[0].eval_value
+        left_d = var.children[0].forward_value
+        right_val = var.children[1].eval_value
+        right_d = var.children[1].forward_value
+        var.forward_value = (
             left_d / right_val
             + right_d * -1 * left_val * right_val**-2
         )
 
-    def _backward(self):
+    def _backward(self, var: "Var"):
         """Progagate grad values to children of multiply operator."""
-        d_self = self.var.adjoint_value
-        left_val = self.var.children[0].eval_value
-        right_val = self.var.children[1].eval_value
-        self.var.children[0].op.accum_grad(d_self / right_val)
-        self.var.children[1].op.accum_grad(d_self*-1*left_val*right_val**-2)
+        d_self = var.adjoint_value
+        left_val = var.children[0].eval_value
+        right_val = var.children[1].eval_value
+        self.accum_grad(var.children[0], d_self / right_val)
+        self.accum_grad(var.children[1], d_self*-1*left_val*right_val**-2)
+
+
+class MatMul(Op):
+    """Matrix multiplication operator, follows numpy.matmul for shapes."""
+
+    code = MATMUL
+
+    def eval(self, var: "Var"):
+        """Return result of matrix multiplication."""
+        var.eval_value = np.matmul(
+            var.children[0].eval_value, var.children[1].eval_value
+        )
+
+    def forward(self, var: "Var", wrt: Optional["Var"]):
+        """Calculate grad of matrix multiplication."""
+        left, right = var.children
+        left_d = np.broadcast_to(left.forward_value, left.shape)
+        right_d = np.broadcast_to(right.forward_value, right.shape)
+        var.forward_value = (
+            np.matmul(left_d, right.eval_value) + np.matmul(left.eval_value, right_d)
+        )
 
+    def _backward(self, var: "Var"):
+        """Progagate grad values to children of matrix multiply operator.
 
+        With G the adjoint of the result, left gets G @ right.T and right gets
+        left.T @ G. Vectors are treated as a row (left) or column (right).
+        """
+        left, right = var.children
+        left_val = np.asarray(left.eval_value)
+        right_val = np.asarray(right.eval_value)
+        if left_val.ndim == 1:
+            left_val = left_val[np.newaxis, :]
+        if right_val.ndim == 1:
+            right_val = right_val[:, np.newaxis]
+        shape = np.broadcast_shapes(left_val.shape[:-2], right_val.shape[:-2]) + (
+            left_val.shape[-2], right_val.shape[-1]
+        )
+        grad = np.broadcast_to(var.adjoint_value, var.shape).reshape(shape)
+        left_d = np.matmul(grad, np.swapaxes(right_val, -1, -2))
+        right_d = np.matmul(np.swapaxes(left_val, -1, -2), grad)
+        if np.ndim(left.eval_value) == 1:
+            left_d = left_d[..., 0, :]
+        if np.ndim(right.eval_value) == 1:
+            right_d = right_d[..., 0]
+        self.accum_grad(left, left_d)
+        self.accum_grad(right, right_d)
+
+
+def expand(grad, shape: Tuple[int, ...], axis: Axis) -> np.ndarray:
+    """Broadcast grad of a reduction over axis back to the reduced shape."""
+    if axis is not None:
+        grad = np.expand_dims(grad, axis)
+    return np.broadcast_to(grad, shape)
+
+
+class Sum(Op):
+    """Sum operator, over all elements or along the axis in attr."""
+
+    code = SUM
+
+    def eval(self, var: "Var"):
+        """Return result of sum."""
+        var.eval_value = np.sum(var.children[0].eval_value, axis=var.attr)
+
+    def forward(self, var: "Var", wrt: Optional["Var"]):
+        """Calculate grad of sum."""
+        child = var.children[0]
+        var.forward_value = np.sum(
+            np.broadcast_to(child.forward_value, child.shape), axis=var.attr
+        )
+
+    def _backward(self, var: "Var"):
+        """Progagate grad values to children of sum operator."""
+        child = var.children[0]
+        self.accum_grad(child, expand(var.adjoint_value, child.shape, var.attr))
 
-class Var:
-    """Node in a graph."""
 
-    def __init__(self, name: str = ""):
-        """Intialize node, by default grad & adjoint are 0.0."""
+class Mean(Op):
+    """Mean operator, over all elements or along the axis in attr."""
+
+    code = MEAN
+
+    def eval(self, var: "Var"):
+        """Return result of mean."""
+        var.eval_value = np.mean(var.children[0].eval_value, axis=var.attr)
+
+    def forward(self, var: "Var", wrt: Optional["Var"]):
+        """Calculate grad of mean."""
+        child = var.children[0]
+        var.forward_value = np.mean(
+            np.broadcast_to(child.forward_value, child.shape), axis=var.attr
+        )
+
+    def _backward(self, var: "Var"):
+        """Progagate grad values to children of mean operator."""
+        child = var.children[0]
+        count = np.size(child.eval_value) // np.size(var.eval_value)
+        self.accum_grad(
+            child, expand(var.adjoint_value, child.shape, var.attr) / count
+        )
+
+
+class Max(Op):
+    """Max operator, over all elements or along the axis in attr.
+
+    Grad is split evenly between tied maximum elements.
+    """
+
+    code = MAX
+
+    def eval(self, var: "Var"):
+        """Return result of max."""
+        var.eval_value = np.max(var.children[0].eval_value, axis=var.attr)
+
+    def _mask(self, var: "Var") -> np.ndarray:
+        """Return share of each child element in the maximum."""
+        child = var.children[0]
+        mask = child.eval_value == expand(var.eval_value, child.shape, var.attr)
+        return mask / np.sum(mask, axis=var.attr, keepdims=True)
+
+    def forward(self, var: "Var", wrt: Optional["Var"]):
+        """Calculate grad of max."""
+        child = var.children[0]
+        var.forward_value = np.sum(
+            self._mask(var) * child.forward_value, axis=var.attr
+        )
+
+    def _backward(self, var: "Var"):
+        """Progagate grad values to children of max operator."""
+        child = var.children[0]
+        self.accum_grad(
+            child,
+            self._mask(var) * expand(var.adjoint_value, child.shape, var.attr)
+        )
+
+
+class StopGradient(Op):
+    """Identity operator treating its child as a constant for grads."""
+
+    code = STOP
+
+    def eval(self, var: "Var"):
+        """Return value of the child."""
+        var.eval_value = var.children[0].eval_value
+
+    def forward(self, var: "Var", wrt: Optional["Var"]):
+        """Child is seen as a constant, so there is no tangent."""
+        var.forward_value = 0.0
+
+    def _backward(self, var: "Var"):
+        """Grad is not propagated to the child."""
+
+
+# Shared operator instances indexed by opcode.
+OPS: Tuple[Op, ...] = (
+    Val(), Add(), Sub(), Neg(), Mult(), Pow(), Div(), MatMul(), Sum(), Mean(), Max(),
+    Const(), StopGradient(),
+)
+
+
+class Var:  # pylint: disable=too-many-instance-attributes,too-many-public-methods
+    """Node in a graph.
+
+    Values may be numbers or numpy arrays. Operators then work elementwise
+    with broadcasting and adjoints take the shape of the value they belong to.
+
+    Nodes are slotted and keep an opcode instead of an Op instance, children
+    are held in a tuple. A binary operator node takes about 270 bytes when
+    built (see tests/test_graph.py::test_node_size), each evaluated float
+    field adds 24 more.
+    """
+
+    __slots__ = (
+        "name",
+        "eval_value",
+        "forward_value",
+        "adjoint_value",
+        "opcode",
+        "attr",
+        "parents",
+        "children",
+        "dirty",
+        "requires_grad",
+        "_order",
+        "_active",
+    )
+
+    # Number of order() calls served from / missing the topological order cache.
+    order_hits: int = 0
+    order_misses: int = 0
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        name: str = "",
+        opcode: int = VAL,
+        children: Tuple["Var", ...] = (),
+        attr: Axis = None,
+        requires_grad: bool = True,
+    ):
+        """Intialize node, by default grad & adjoint are 0.0.
+
+        attr holds an operator argument, such as the axis of a reduction.
+        requires_grad marks a leaf as trainable, set it to False for data.
+        Operator nodes require grad when any of their children does, so the
+        flag of a leaf must be set before building expressions on it.
+        """
         self.name = name
-        self.eval_value: float = float("nan")
-        self.forward_value: float = float("nan")
-        self.adjoint_value: float = float("nan")
-        self.op: Op = Val(self)  # pylint: disable=invalid-name
+        self.eval_value: float = NAN
+        self.forward_value: float = NAN
+        self.adjoint_value: float = NAN
+        self.opcode = opcode
+        self.attr = attr
         self.parents: List["Var"] = []
-        self.children: List["Var"] = []
+        self.children: Tuple["Var", ...] = children
+        self.dirty = True
+        self.requires_grad = opcode not in NO_GRAD and (
+            any(child.requires_grad for child in children)
+            if children else requires_grad
+        )
+        self._order: Optional[List["Var"]] = None
+        self._active: Optional[Dict[tuple, Tuple[List["Var"], Set["Var"]]]] = None
+        for child in children:
+            if child.opcode != CONST:
+                child.parents.append(self)
+
+    @property
+    def op(self) -> Op:  # pylint: disable=invalid-name
+        """Return operator of the node."""
+        return OPS[self.opcode]
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        """Return shape of the node's value, () for a number."""
+        return np.shape(self.eval_value)
 
     def assign(self, val: float):
-        """Assign value to the node."""
+        """Assign value to the node and mark nodes depending on it dirty.
+
+        Constants can not be assigned, they may be shared between graphs.
+        """
+        if self.opcode == CONST:
+            raise ValueError(f"constant {self.name} can not be assigned")
         self.eval_value = val
+        self.mark_dirty()
+
+    def mark_dirty(self):
+        """Mark this node and every node above it for re-evaluation.
+
+        A dirty node always has dirty parents, so walking stops at nodes
+        which are already dirty.
+        """
+        pending: List["Var"] = [self]
+        while pending:
+            current = pending.pop()
+            current.dirty = True
+            for parent in current.parents:
+                if not parent.dirty:
+                    pending.append(parent)
 
     def add_child(self, child: "Var"):
         """Add given node as a child."""
-        self.children.append(child)
-        child.parents.append(self)
+        self.children += (child,)
+        if child.opcode != CONST:
+            child.parents.append(self)
+        self.invalidate()
 
     def add_parent(self, parent: "Var"):
         """Add given node as parent."""
         self.parents.append(parent)
-        parent.children.append(self)
+        parent.children += (self,)
+        parent.invalidate()
+
+    def make_constant(self, val: Union[float, np.ndarray]):
+        """Turn the node into a constant leaf holding given value."""
+        for child in self.children:
+            if child.opcode != CONST:
+                child.parents.remove(self)
+        self.name = str(val)
+        self.opcode = CONST
+        self.attr = None
+        self.children = ()
+        self.requires_grad = False
+        self.eval_value = val
+        self.invalidate()
+
+    def rewrite(self, name: str, opcode: int, children: Tuple["Var", ...]):
+        """Turn the node into another operator over given children."""
+        for child in self.children:
+            if child.opcode != CONST:
+                child.parents.remove(self)
+        for child in children:
+            if child.opcode != CONST:
+                child.parents.append(self)
+        self.name = name
+        self.opcode = opcode
+        self.attr = None
+        self.children = children
+        self.requires_grad = opcode not in NO_GRAD and any(
+            child.requires_grad for child in children
+        )
+        self.invalidate()
+
+    def replace_with(self, other: "Var"):
+        """Make every parent of the node use other in its place.
+
+        The node keeps its children but is no longer listed as their parent,
+        nor are nodes only it used, so updates to leaves do not walk them.
+        """
+        parents = list(dict.fromkeys(self.parents))
+        self.parents = []
+        for parent in parents:
+            children = []
+            for child in parent.children:
+                if child is self:
+                    child = other
+                    if other.opcode != CONST:
+                        other.parents.append(parent)
+                children.append(child)
+            parent.children = tuple(children)
+            parent.invalidate()
+        pending: List["Var"] = [self]
+        while pending:
+            dead = pending.pop()
+            for child in set(dead.children):
+                if child.opcode == CONST:
+                    continue
+                child.parents = [node for node in child.parents if node is not dead]
+                if not child.parents and child is not other:
+                    pending.append(child)
+
+    def invalidate(self):
+        """Drop cached orders and values of this node and every node above it."""
+        pending: List["Var"] = [self]
+        seen = {self}
+        while pending:
+            current = pending.pop()
+            current._order = None  # pylint: disable=protected-access
+            current._active = None  # pylint: disable=protected-access
+            current.dirty = True
+            for parent in current.parents:
+                if parent not in seen:
+                    pending.append(parent)
+                    seen.add(parent)
+
+    def order(self) -> List["Var"]:
+        """Return cached depth first order of the graph rooted with this node."""
+        if self._order is None:
+            Var.order_misses += 1
+            self._order = list(self.dfs())
+        else:
+            Var.order_hits += 1
+        return self._order
 
     def __add__(self, other: NodeType):
         """Return new node that represents add operation on self and other."""
         resolved = Var.resolve(other)
-        new = Var("+")
-        new.op = Add(new)
-        new.add_child(self)
-        new.add_child(resolved)
-        return new
+        return Var.make("+", ADD, (self, resolved))
 
     def __mul__(self, other: NodeType):
         """Return new node that represents multiplication operation on self and other."""
         resolved = Var.resolve(other)
-        new = Var("*")
-        new.op = Mult(new)
-        new.add_child(self)
-        new.add_child(resolved)
-        return new
+        return Var.make("*", MULT, (self, resolved))
 
     def __truediv__(self, other: NodeType):
         """Return new node that represents division operation on self and other."""
         resolved = Var.resolve(other)
-        new = Var("/")
-        new.op = Div(new)
-        new.add_child(self)
-        new.add_child(resolved)
-        return new
+        return Var.make("/", DIV, (self, resolved))
 
     def __sub__(self, other: NodeType):
         """Return new node that represents subtraciton operator on self and other."""
         resolved = Var.resolve(other)
-        new = Var("-")
-        new.op = Sub(new)
-        new.add_child(self)
-        new.add_child(resolved)
-        return new
+        return Var.make("-", SUB, (self, resolved))
 
     def __neg__(self):
         """Return new node that represents negation on self."""
-        new = Var("-")
-        new.op = Neg(new)
-        new.add_child(self)
-        return new
+        return Var.make("-", NEG, (self,))
 
     def __pow__(self, other):
         """Return new node that represents self^other."""
-        new = Var("^")
-        new.op = Pow(new)
-        new.add_child(self)
-        power = Var.resolve(other)
-        power.op = Val(power)
-        new.add_child(power)
-        return new
-
-    def value(self) -> float:
-        """Evaluate and return value of the node."""
-        for node in self.dfs():
-            node.op.eval()
+        return Var.make("^", POW, (self, Var.resolve(other)))
+
+    def __matmul__(self, other: "Var"):
+        """Return new node that represents matrix multiplication of self and other."""
+        return Var.make("@", MATMUL, (self, other))
+
+    def sum(self, axis: Axis = None):
+        """Return new node that represents sum of elements, along axis if given."""
+        return Var.make("sum", SUM, (self,), axis)
+
+    def mean(self, axis: Axis = None):
+        """Return new node that represents mean of elements, along axis if given."""
+        return Var.make("mean", MEAN, (self,), axis)
+
+    def max(self, axis: Axis = None):
+        """Return new node that represents max of elements, along axis if given."""
+        return Var.make("max", MAX, (self,), axis)
+
+    def value(self, feed: Optional[Feed] = None) -> Union[float, np.ndarray]:
+        """Evaluate and return value of the node.
+
+        Only nodes marked dirty since the last evaluation are recomputed.
+        Leaves given in feed are evaluated with the fed values, so arrays
+        evaluate the graph elementwise and an array is returned.
+        """
+        if feed:
+            with feeding(feed):
+                return self.value()
+        if not self.dirty:
+            return self.eval_value
+        for node in self.order():
+            if node.dirty:
+                OPS[node.opcode].eval(node)
+                node.dirty = False
         return self.eval_value
 
     def grad(self) -> float:
@@ -318,81 +758,273 @@ class Var:
 
     def print(self, prefix: str = ""):
         """Print node and children on console."""
-        self.op.print(prefix)
+        self.op.print(self, prefix)
 
-    def forward(self, wrt: "Var") -> float:
+    def forward(
+        self, wrt: Union["Var", Sequence["Var"]]
+    ) -> Union[float, np.ndarray]:
         """Calculate forward gradient with respect to given node and return its value.
 
-        This also triggers evaluation.
+        Given a sequence of nodes, each node carries a vector of tangents, one
+        per direction, and an array of all the derivatives is returned from a
+        single sweep, for graphs of scalar values only. Nodes not requiring
+        grad get no tangent. This also triggers evaluation.
         """
         self.value()
-        for node in self.dfs():
-            node.op.forward(cast("Var", wrt))
+        if isinstance(wrt, Var):
+            for node in self.order():
+                if node.requires_grad:
+                    OPS[node.opcode].forward(node, wrt)
+                else:
+                    node.forward_value = 0.0
+            return self.forward_value
+        if any(isinstance(node.eval_value, np.ndarray) for node in self.order()):
+            raise ValueError("forward over a sequence needs scalar node values")
+        seeds = dict(zip(wrt, np.eye(len(wrt))))
+        zero = np.zeros(len(wrt))
+        for node in self.order():
+            if not node.requires_grad:
+                node.forward_value = 0.0
+            elif node.opcode == VAL:
+                node.forward_value = seeds.get(node, zero)
+            else:
+                OPS[node.opcode].forward(node, None)
         return self.forward_value
 
-    def backward(self):
+    def backward(self, wrt: Optional[Iterable["Var"]] = None):
         """Calculate backward gradient.
 
         Value of gradient can be fetched using adjoint function on the node.
+        Evaluation and clearing of grads share a single forward sweep. Given
+        wrt, only nodes on a path from this node to one of them propagate
+        their adjoint, and only the grads of nodes in wrt are complete. Nodes
+        not requiring grad never propagate.
         """
-        self.value()
-        self.clear_grad()
-        self.op.backward(True)
-        for node in self.bfs():
-            node.op.backward()
+        self._sweep(self.order() if wrt is None else self.active(wrt))
+
+    def _sweep(self, active: List["Var"]):
+        """Evaluate the graph, clear grads and propagate adjoints of active nodes."""
+        for node in self.order():
+            if node.dirty:
+                OPS[node.opcode].eval(node)
+                node.dirty = False
+            node.adjoint_value = 0.0
+        self.op.backward(self, True)
+        for node in reversed(active):
+            if node.requires_grad:
+                OPS[node.opcode].backward(node)
+
+    def active(self, wrt: Iterable["Var"]) -> List["Var"]:
+        """Return nodes on a path from this node to any of given nodes, in order.
+
+        Results are cached by wrt until the graph changes.
+        """
+        return self._active_nodes(wrt)[0]
+
+    def _active_nodes(self, wrt: Iterable["Var"]) -> Tuple[List["Var"], Set["Var"]]:
+        """Return cached active nodes for wrt, as a list in order and as a set."""
+        key = tuple(wrt)
+        if self._active is None:
+            self._active = {}
+        cached = self._active.get(key)
+        if cached is not None:
+            return cached
+        active = set(key)
+        result = []
+        for node in self.order():
+            if node in active or any(child in active for child in node.children):
+                active.add(node)
+                result.append(node)
+        if len(self._active) >= ACTIVE_CACHE_SIZE:
+            del self._active[next(iter(self._active))]
+        cached = self._active[key] = (result, set(result))
+        return cached
+
+    def value_and_grad(
+        self,
+        params: Iterable["Var"],
+        feed: Optional[Feed] = None,
+        reduction: str = "sum",
+    ) -> Tuple[Union[float, np.ndarray], Dict["Var", Union[float, np.ndarray]]]:
+        """Return value of the node and its gradient for each of given nodes.
+
+        Runs one forward and one reverse sweep over the cached order. With a
+        feed of per-sample arrays the node holds one value per sample. Value
+        and gradients are then summed ("sum"), averaged ("mean") or returned
+        per sample ("none") according to reduction. Samples are taken along
+        the first axis of the fed arrays. Per sample grads are only supported
+        for elementwise graphs. A node which already reduces over the
+        samples, such as a mean loss, is returned as is.
+        """
+        if reduction not in ("sum", "mean", "none"):
+            raise ValueError(f"unknown reduction: {reduction}")
+        params = list(params)
+        if not feed:
+            active, inside = self._active_nodes(params)
+            self._sweep(active)
+            return self.eval_value, {
+                param: param.adjoint_value if param in inside else 0.0
+                for param in params
+            }
+        batch = {leaf: np.asarray(val, dtype=float) for leaf, val in feed.items()}
+        count = max((len(val) for val in batch.values() if val.ndim), default=0)
+        if reduction == "none" and count:
+            if any(node.opcode in REDUCING for node in self.order()):
+                raise ValueError(
+                    "per sample grads need an elementwise graph, without "
+                    "matmul, sum, mean or max"
+                )
+            # a copy of each parameter per sample keeps adjoints per sample
+            for param in params:
+                if param not in batch:
+                    batch[param] = np.broadcast_to(
+                        param.eval_value, (count,) + np.shape(param.eval_value)
+                    )
+        with feeding(batch):
+            self.backward(params)
+            val = self.eval_value
+            grads = self._grads(params)
+        if reduction == "none" or np.shape(val)[:1] != (count,):
+            # nothing to reduce when the node already reduced over samples
+            return val, grads
+        if reduction == "mean":
+            return np.sum(val) / count, {
+                param: grad / count for param, grad in grads.items()
+            }
+        return np.sum(val), grads
+
+    def _grads(self, params: List["Var"]) -> Dict["Var", Union[float, np.ndarray]]:
+        """Return adjoints of given nodes, 0.0 for nodes outside the graph."""
+        nodes = self._active_nodes(params)[1]
+        return {
+            param: param.adjoint_value if param in nodes else 0.0
+            for param in params
+        }
 
     def clear_grad(self):
         """Clear out all values of grad in graph."""
-        for node in self.dfs():
+        for node in self.order():
             node.adjoint_value = 0.0
 
     def dfs(self) -> Iterable["Var"]:
-        """Return nodes of the graph rooted with this node in depth first order."""
+        """Return nodes of the graph rooted with this node in depth first order.
+
+        Children are always yielded before their parents, even when shared.
+        """
         pending: Deque[Tuple["Var", bool]] = deque()
         seen = set()
         pending.append((self, False))
-        seen.add(self)
         while pending:
             current, expanded = pending.pop()
             if expanded:
                 yield current
-            else:
-                if current.children:
-                    pending.append((current, True))
-                    for child in current.children:
-                        if child not in seen:
-                            pending.append((child, False))
-                            seen.add(child)
-                else:
-                    yield current
-
-    def bfs(self) -> Iterable["Var"]:
-        """Return nodes of the graph rooted with this node in breadth first order."""
-        pending: Deque["Var"] = deque()
-        seen = set()
-        yielded = set()
-        pending.append(self)
-        seen.add(self)
-        while pending:
-            current = pending.pop()
-            if not current.parents or all(
-                parent in yielded for parent in current.parents
-            ):
-                yield current
-                yielded.add(current)
+            elif current not in seen:
+                seen.add(current)
+                pending.append((current, True))
                 for child in current.children:
                     if child not in seen:
-                        pending.append(child)
-                        seen.add(child)
-            else:
-                pending.appendleft(current)
+                        pending.append((child, False))
+
+    def bfs(self) -> Iterable["Var"]:
+        """Return nodes of the graph rooted with this node in reverse topological order.
+
+        Every node comes after all of its parents within the graph, parents
+        outside of the graph are ignored.
+        """
+        return reversed(self.order())
+
+    @classmethod
+    def make(
+        cls, name: str, opcode: int, children: Tuple["Var", ...], attr: Axis = None
+    ) -> "Var":
+        """Return operator node, shared with an identical one inside interning()."""
+        if _INTERNED is None:
+            return Var(name, opcode, children, attr)
+        if opcode in COMMUTATIVE:
+            key = (opcode, tuple(sorted(children, key=id)), attr)
+        else:
+            key = (opcode, children, attr)
+        node = _INTERNED.get(key)
+        if node is None:
+            node = _INTERNED[key] = Var(name, opcode, children, attr)
+        return node
 
     @classmethod
     def resolve(cls, node: NodeType) -> "Var":
-        """Convert to Var if not already a Var."""
+        """Convert to Var if not already a Var, numbers become shared constants."""
         if isinstance(node, get_args(Number)):
-            new = Var(str(node))
-            new.op = Val(new)
-            new.assign(float(cast(Union[float, int], node)))
-            return new
+            val = float(cast(Union[float, int], node))
+            return literal(val, math.copysign(1.0, val))
         return cast("Var", node)
+
+
+@lru_cache(maxsize=LITERAL_CACHE_SIZE)
+def literal(val: float, sign: float) -> Var:  # pylint: disable=unused-argument
+    """Return constant node for a number, shared by every use of the number.
+
+    sign tells 0.0 and -0.0 apart. Constants do not keep their parents, so a
+    cached constant does not keep graphs using it alive.
+    """
+    new = Var(str(val), CONST)
+    new.eval_value = val
+    return new
+
+
+def literal_stats():
+    """Return hits (allocations avoided), misses and size of the literal cache."""
+    return literal.cache_info()
+
+
+@contextmanager
+def interning() -> Iterator[None]:
+    """Share structurally identical nodes built inside the block.
+
+    Operator nodes with the same opcode, children and argument are built
+    once. Addition and multiplication match regardless of the order of their
+    operands. Leaves created with Var() are never shared.
+    """
+    global _INTERNED  # pylint: disable=global-statement
+    previous = _INTERNED
+    if previous is None:
+        _INTERNED = {}
+    try:
+        yield
+    finally:
+        _INTERNED = previous
+
+
+@contextmanager
+def feeding(feed: Feed) -> Iterator[None]:
+    """Assign fed values to leaves, restore previous values on exit.
+
+    Sequences are converted to float arrays, numbers and arrays broadcast
+    against each other with NumPy rules.
+    """
+    saved = [(leaf, leaf.eval_value) for leaf in feed]
+    for leaf, val in feed.items():
+        leaf.assign(
+            val if isinstance(val, get_args(Number)) else np.asarray(val, dtype=float)
+        )
+    try:
+        yield
+    finally:
+        for leaf, val in saved:
+            leaf.assign(val)
+
+
+def matmul(left: Var, right: Var) -> Var:
+    """Return new node that represents matrix multiplication of given nodes."""
+    return left @ right
+
+
+def dot(left: Var, right: Var) -> Var:
+    """Return new node that represents dot product of given vectors.
+
+    Same as matmul, so it also covers matrix-vector and matrix products.
+    """
+    return left @ right
+
+
+def stop_gradient(node: Var) -> Var:
+    """Return new node with the value of given node, seen as a constant for grads."""
+    return Var.make("stop", STOP, (node,))
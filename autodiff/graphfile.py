@@ -0,0 +1,171 @@
+"""Compact binary file format for graphs, loaded by memory mapping.
+
+A file starts with a header of magic, version, node count and size of the
+names, followed by one array per field of the nodes in topological order:
+
+    values       float64[count]   node values, leaves hold parameters & constants
+    name_offsets int64[count + 1] start of each name in names
+    lefts        int32[count]     position of the first child, -1 if none
+    rights       int32[count]     position of the second child, -1 if none
+    opcodes      uint8[count]
+    flags        uint8[count]     1 when the node requires grad
+    names        bytes            utf-8 names of the nodes, concatenated
+
+Arrays are little-endian and stored largest item first, so all are aligned.
+"""
+from typing import List
+import numpy as np
+from autodiff.graph import CONST, VAL, Var
+from autodiff.tape import SCALAR_OPS, Tape
+
+MAGIC = b"ADGRAPH\0"
+VERSION = 1
+HEADER = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u4"),
+        ("reserved", "<u4"),
+        ("count", "<u8"),
+        ("names_size", "<u8"),
+    ]
+)
+
+
+def save(root: Var, path: str):
+    """Write graph rooted with given node to a file.
+
+    Current values of the nodes are saved. Only scalar operators can be
+    saved, as for tapes.
+    """
+    nodes = root.order()
+    for node in nodes:
+        if node.opcode not in SCALAR_OPS:
+            raise ValueError(f"operator {node.name} can not be saved")
+    index = {node: idx for idx, node in enumerate(nodes)}
+    names = [node.name.encode() for node in nodes]
+    offsets = np.zeros(len(nodes) + 1, dtype="<i8")
+    np.cumsum([len(name) for name in names], out=offsets[1:])
+    header = np.zeros(1, dtype=HEADER)
+    header[0] = (MAGIC, VERSION, 0, len(nodes), offsets[-1])
+    arrays = [
+        header,
+        np.array([float(node.eval_value) for node in nodes], dtype="<f8"),
+        offsets,
+        np.array(
+            [index[node.children[0]] if node.children else -1 for node in nodes],
+            dtype="<i4",
+        ),
+        np.array(
+            [index[node.children[1]] if len(node.children) > 1 else -1
+             for node in nodes],
+            dtype="<i4",
+        ),
+        np.array([node.opcode for node in nodes], dtype="u1"),
+        np.array([node.requires_grad for node in nodes], dtype="u1"),
+    ]
+    with open(path, "wb") as file:
+        for array in arrays:
+            file.write(array.tobytes())
+        file.write(b"".join(names))
+
+
+class GraphFile:  # pylint: disable=too-many-instance-attributes
+    """Graph file mapped into memory, its arrays are views of the file.
+
+    With the default copy-on-write mode values can be changed in memory
+    without touching the file, use mode "r+" to write them through.
+    """
+
+    def __init__(self, path: str, mode: str = "c"):
+        """Map given file into memory."""
+        self.data = np.memmap(  # type: ignore[call-overload]
+            path, dtype="u1", mode=mode
+        )
+        header = self.data[:HEADER.itemsize].view(HEADER)[0]
+        if header["magic"] != MAGIC.rstrip(b"\0"):
+            raise ValueError(f"{path} is not a graph file")
+        if header["version"] != VERSION:
+            raise ValueError(f"unsupported version: {header['version']}")
+        count = int(header["count"])
+        offset = HEADER.itemsize
+        fields = []
+        for dtype, size in (
+            ("<f8", count),
+            ("<i8", count + 1),
+            ("<i4", count),
+            ("<i4", count),
+            ("u1", count),
+            ("u1", count),
+            ("u1", int(header["names_size"])),
+        ):
+            fields.append(
+                np.ndarray((size,), dtype=dtype, buffer=self.data, offset=offset)
+            )
+            offset += fields[-1].nbytes
+        (
+            self.values,
+            self.name_offsets,
+            self.lefts,
+            self.rights,
+            self.opcodes,
+            self.flags,
+            self.name_bytes,
+        ) = fields
+
+    def __len__(self) -> int:
+        """Return number of nodes in the file."""
+        return len(self.opcodes)
+
+    def name(self, idx: int) -> str:
+        """Return name of the node at given position."""
+        start, end = self.name_offsets[idx:idx + 2]
+        return self.name_bytes[start:end].tobytes().decode()
+
+    def names(self) -> List[str]:
+        """Return names of all nodes."""
+        text = self.name_bytes.tobytes()
+        offsets = self.name_offsets.tolist()
+        return [
+            text[start:end].decode() for start, end in zip(offsets, offsets[1:])
+        ]
+
+    def tape(self) -> Tape:
+        """Return tape of the graph, copying the mapped arrays to lists.
+
+        This is the fast way to evaluate a loaded graph, see
+        benchmarks/graphfile.py.
+        """
+        return Tape(
+            self.opcodes.tolist(),
+            self.lefts.tolist(),
+            self.rights.tolist(),
+            self.values.tolist(),
+            self.names(),
+        )
+
+    def graph(self) -> Var:
+        """Build nodes of the graph and return its root.
+
+        One node is made per entry, so this takes about as long as building
+        the graph with operators.
+        """
+        nodes: List[Var] = []
+        for code, left, right, val, name, flag in zip(
+            self.opcodes.tolist(),
+            self.lefts.tolist(),
+            self.rights.tolist(),
+            self.values.tolist(),
+            self.names(),
+            self.flags.tolist(),
+        ):
+            children = tuple(nodes[pos] for pos in (left, right) if pos >= 0)
+            node = Var(name, code, children, requires_grad=bool(flag))
+            if code in (VAL, CONST):
+                node.eval_value = val
+            nodes.append(node)
+        return nodes[-1]
+
+
+def load(path: str, mode: str = "c") -> GraphFile:
+    """Map graph file into memory, see GraphFile."""
+    return GraphFile(path, mode)
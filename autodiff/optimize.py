@@ -0,0 +1,85 @@
+"""Optimization passes rewriting a graph in place."""
+from typing import Optional
+from autodiff.graph import ADD, CONST, DIV, MULT, NEG, OPS, POW, SUB, Var
+
+# Largest integer power turned into multiplications.
+MAX_POWER = 4
+
+
+def fold_constants(root: Var) -> Var:
+    """Replace every subgraph with only constant leaves by a single constant.
+
+    Return the root, which is itself folded when the whole graph is constant.
+    """
+    for node in root.order():
+        if node.children and all(child.opcode == CONST for child in node.children):
+            OPS[node.opcode].eval(node)
+            node.make_constant(node.eval_value)
+    return root
+
+
+def _number(node: Var) -> Optional[float]:
+    """Return value of a constant number node, None for anything else."""
+    if node.opcode == CONST and isinstance(node.eval_value, (float, int)):
+        return node.eval_value
+    return None
+
+
+def _product(base: Var, power: int) -> Var:
+    """Return node computing base**power with multiplications, power >= 1."""
+    if power == 1:
+        return base
+    half = _product(base, power // 2)
+    square = Var.make("*", MULT, (half, half))
+    return square if power % 2 == 0 else Var.make("*", MULT, (square, base))
+
+
+def _identity(node: Var) -> Optional[Var]:
+    """Return node which node is equivalent to, None if there is none."""
+    left = node.children[0]
+    right = node.children[-1]
+    if node.opcode == ADD and _number(left) == 0.0:
+        return right
+    if node.opcode in (ADD, SUB) and _number(right) == 0.0:
+        return left
+    if node.opcode == MULT and _number(left) == 1.0:
+        return right
+    if node.opcode in (MULT, DIV, POW) and _number(right) == 1.0:
+        return left
+    if node.opcode == NEG and left.opcode == NEG:
+        return left.children[0]
+    return None
+
+
+def simplify(root: Var) -> Var:
+    """Apply algebraic simplifications and strength reductions in place.
+
+    Drops x*1, 1*x, x/1, x**1, x+0, 0+x, x-0 and --x, turns small integer
+    powers into multiplications and division by a constant into
+    multiplication by its reciprocal. Run fold_constants first so constant
+    subgraphs are seen as constants. Return the root, which is a different
+    node when the root itself was dropped.
+    """
+    for node in root.order():
+        if not node.children:
+            continue
+        same = _identity(node)
+        if same is not None:
+            node.replace_with(same)
+            if node is root:
+                root = same
+            continue
+        right = _number(node.children[-1])
+        if node.opcode == POW and right is not None:
+            if float(right).is_integer() and 2 <= right <= MAX_POWER:
+                base = node.children[0]
+                power = int(right)
+                node.rewrite(
+                    "*",
+                    MULT,
+                    (_product(base, power // 2),) * 2 if power % 2 == 0
+                    else (_product(base, power - 1), base),
+                )
+        elif node.opcode == DIV and right:
+            node.rewrite("*", MULT, (node.children[0], Var.resolve(1.0 / right)))
+    return root
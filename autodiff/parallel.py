@@ -0,0 +1,214 @@
+"""Parallel evaluation of graphs."""
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from autodiff.graph import OPS, Var
+from autodiff.tape import Tape, compile as compile_tape
+
+
+def levels(root: Var) -> List[List[Var]]:
+    """Return nodes of the graph grouped by topological level.
+
+    Leaves are on level 0 and every other node is one level above its
+    highest child, so nodes of a level only depend on lower levels.
+    """
+    depth: Dict[Var, int] = {}
+    result: List[List[Var]] = []
+    for node in root.order():
+        level = max((depth[child] + 1 for child in node.children), default=0)
+        depth[node] = level
+        if level == len(result):
+            result.append([])
+        result[level].append(node)
+    return result
+
+
+def _eval_nodes(nodes: List[Var]):
+    """Evaluate given nodes of one level."""
+    for node in nodes:
+        OPS[node.opcode].eval(node)
+        node.dirty = False
+
+
+class ParallelEvaluator:
+    """Evaluate a graph level by level, spreading wide levels on a thread pool.
+
+    Levels with fewer dirty nodes than threshold are evaluated serially.
+    Threads only pay off when nodes hold large arrays whose NumPy kernels
+    release the GIL.
+    """
+
+    def __init__(
+        self, root: Var, workers: Optional[int] = None, threshold: int = 64
+    ):
+        """Initialize evaluator of given graph, by default one thread per CPU."""
+        self.root = root
+        self.threshold = threshold
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._order: Optional[List[Var]] = None
+        self._levels: List[List[Var]] = []
+
+    def levels(self) -> List[List[Var]]:
+        """Return levels of the graph, computed again when the graph changed."""
+        order = self.root.order()
+        if order is not self._order:
+            self._order = order
+            self._levels = levels(self.root)
+        return self._levels
+
+    def value(self) -> Union[float, np.ndarray]:
+        """Evaluate and return value of the root, recomputing dirty nodes."""
+        if not self.root.dirty:
+            return self.root.eval_value
+        for level in self.levels():
+            dirty = [node for node in level if node.dirty]
+            if len(dirty) < max(self.threshold, 1):
+                _eval_nodes(dirty)
+                continue
+            size = -(-len(dirty) // self.workers)
+            chunks = [dirty[idx:idx + size] for idx in range(0, len(dirty), size)]
+            for _ in self.executor.map(_eval_nodes, chunks):
+                pass
+        return self.root.eval_value
+
+    def close(self):
+        """Shut down the thread pool."""
+        self.executor.shutdown()
+
+    def __enter__(self) -> "ParallelEvaluator":
+        """Return the evaluator."""
+        return self
+
+    def __exit__(self, *args):
+        """Shut down the thread pool."""
+        self.close()
+
+
+# State of a data parallel worker process, set up by _init_worker.
+_WORKER: dict = {}
+
+
+def _init_worker(
+    tape: Tape, params: List[int], params_name: str, grads_name: str
+):
+    """Attach worker process to the tape and shared parameter and grad buffers."""
+    params_shm = shared_memory.SharedMemory(name=params_name)
+    grads_shm = shared_memory.SharedMemory(name=grads_name)
+    _WORKER.update(
+        tape=tape,
+        params=params,
+        shm=(params_shm, grads_shm),
+        param_values=np.ndarray((len(params),), np.float64, buffer=params_shm.buf),
+        grads=np.ndarray(
+            (grads_shm.size // 8 // len(params), len(params)),
+            np.float64,
+            buffer=grads_shm.buf,
+        ),
+    )
+
+
+def _worker_grad(task: Tuple[int, List[int], np.ndarray]) -> float:
+    """Sum loss and grads over samples of a chunk into the task's grad row.
+
+    Columns of the chunk are assigned to the input leaves as arrays, so the
+    whole chunk goes through the tape in one batched sweep.
+    """
+    row, inputs, samples = task
+    tape: Tape = _WORKER["tape"]
+    params: List[int] = _WORKER["params"]
+    for pos, val in zip(params, _WORKER["param_values"].tolist()):
+        tape.values[pos] = val
+    for pos, column in zip(inputs, samples.T):
+        tape.values[pos] = column
+    tape.backward()
+    _WORKER["grads"][row] = [np.sum(tape.adjoints[pos]) for pos in params]
+    return float(np.sum(tape.values[-1]))
+
+
+class DataParallelTrainer:  # pylint: disable=too-many-instance-attributes
+    """Compute minibatch gradients of a scalar loss on a pool of processes.
+
+    The loss is compiled to a tape and sent to each worker process once.
+    Parameter values and one row of grads per worker live in shared memory,
+    every call splits the minibatch between workers, each running a batched
+    sweep over its chunk, and sums their rows.
+    """
+
+    def __init__(
+        self, loss: Var, params: Sequence[Var], workers: Optional[int] = None
+    ):
+        """Initialize trainer and start its workers, by default one per CPU."""
+        self.params = list(params)
+        if not self.params:
+            raise ValueError("data parallel training needs at least one param")
+        self.tape = compile_tape(loss)
+        self.workers = workers or os.cpu_count() or 1
+        size = 8 * len(self.params)
+        self._params_shm = shared_memory.SharedMemory(create=True, size=size)
+        self._grads_shm = shared_memory.SharedMemory(
+            create=True, size=size * self.workers
+        )
+        self.param_values = np.ndarray(
+            (len(self.params),), np.float64, buffer=self._params_shm.buf
+        )
+        self.grads = np.ndarray(
+            (self.workers, len(self.params)), np.float64, buffer=self._grads_shm.buf
+        )
+        self.pool = multiprocessing.Pool(
+            self.workers,
+            initializer=_init_worker,
+            initargs=(
+                self.tape,
+                [self.tape.position(param) for param in self.params],
+                self._params_shm.name,
+                self._grads_shm.name,
+            ),
+        )
+
+    def value_and_grad(
+        self, feed: Dict[Var, Sequence[float]], reduction: str = "sum"
+    ) -> Tuple[float, Dict[Var, float]]:
+        """Return loss and grads over the samples in feed.
+
+        Current values of the parameters are used. Like Var.value_and_grad,
+        reduction is "sum" or "mean".
+        """
+        if reduction not in ("sum", "mean"):
+            raise ValueError(f"unknown reduction: {reduction}")
+        inputs = list(feed)
+        samples = np.column_stack(
+            [np.asarray(feed[leaf], dtype=float) for leaf in inputs]
+        )
+        positions = [self.tape.position(leaf) for leaf in inputs]
+        self.param_values[:] = [param.value() for param in self.params]
+        chunks = np.array_split(samples, self.workers)
+        losses = self.pool.map(
+            _worker_grad,
+            [(row, positions, chunk) for row, chunk in enumerate(chunks)],
+        )
+        loss = sum(losses)
+        grads = self.grads.sum(axis=0)
+        if reduction == "mean":
+            loss /= len(samples)
+            grads /= len(samples)
+        return loss, dict(zip(self.params, grads.tolist()))
+
+    def close(self):
+        """Stop the workers and release shared memory."""
+        self.pool.close()
+        self.pool.join()
+        for shm in (self._params_shm, self._grads_shm):
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self) -> "DataParallelTrainer":
+        """Return the trainer."""
+        return self
+
+    def __exit__(self, *args):
+        """Stop the workers and release shared memory."""
+        self.close()
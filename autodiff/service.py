@@ -0,0 +1,217 @@
+"""Local asyncio service evaluating graphs for other processes.
+
+Requests and responses are JSON objects, one per line. A request names a
+registered graph, an operation and a value for each of its inputs:
+
+    {"id": 1, "graph": "linear", "op": "grad", "feed": {"x": 2.0, "y": 3.0}}
+
+and gets back the value, plus grads of the graph's parameters for "grad":
+
+    {"id": 1, "value": 1.0, "grads": {"w": -4.0, "b": -2.0}}
+
+or {"id": 1, "error": "..."} when the request can not be served. Values
+and grads of array valued nodes are sent as nested lists.
+"""
+import asyncio
+from collections import defaultdict
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from autodiff.graph import REDUCING, Feed, Var
+
+OPERATIONS = ("value", "grad")
+
+
+def _json(val: Union[float, np.ndarray]) -> Union[float, list]:
+    """Return number or nested lists of numbers for a value."""
+    return val.tolist() if isinstance(val, np.ndarray) else float(val)
+
+
+class Model:  # pylint: disable=too-few-public-methods
+    """Graph registered in a service, with its inputs and parameters.
+
+    Graphs combining elements, see REDUCING, would mix samples of a batch,
+    so their requests are evaluated one at a time.
+    """
+
+    def __init__(self, root: Var, inputs: Sequence[Var], params: Sequence[Var]):
+        """Initialize model, inputs are fed by name."""
+        self.root = root
+        self.inputs = {leaf.name: leaf for leaf in inputs}
+        self.params = list(params)
+        self.batched = not any(node.opcode in REDUCING for node in root.order())
+
+
+def _evaluate(model: Model, op: str, request: Dict[str, float]) -> dict:
+    """Return result of a single request."""
+    feed: Feed = {leaf: request[name] for name, leaf in model.inputs.items()}
+    if op == "value":
+        return {"value": _json(model.root.value(feed=feed))}
+    val, grads = model.root.value_and_grad(model.params, feed=feed)
+    return {
+        "value": _json(val),
+        "grads": {param.name: _json(grad) for param, grad in grads.items()},
+    }
+
+
+def _evaluate_batch(
+    model: Model, op: str, requests: List[Dict[str, float]]
+) -> List[dict]:
+    """Return results of requests evaluated as one batch of an elementwise graph.
+
+    The root and every grad must hold one value per request, or a single
+    value shared by all of them.
+    """
+    count = len(requests)
+    feed: Feed = {
+        leaf: np.array([request[name] for request in requests], dtype=float)
+        for name, leaf in model.inputs.items()
+    }
+    grads: Dict[Var, Any] = {}
+    if op == "value":
+        values = model.root.value(feed=feed)
+    else:
+        values, grads = model.root.value_and_grad(
+            model.params, feed=feed, reduction="none"
+        )
+    rows = {}
+    for name, val in [("", values)] + [(p.name, g) for p, g in grads.items()]:
+        if np.shape(val) not in ((), (count,)):
+            raise ValueError(f"{count} requests gave a value of shape {np.shape(val)}")
+        rows[name] = np.broadcast_to(val, (count,)).tolist()
+    value_row = rows.pop("")
+    results = []
+    for idx, val in enumerate(value_row):
+        result: dict = {"value": val}
+        if op == "grad":
+            result["grads"] = {name: row[idx] for name, row in rows.items()}
+        results.append(result)
+    return results
+
+
+class EvalService:  # pylint: disable=too-many-instance-attributes
+    """Serve values and grads of graphs, evaluating concurrent requests in batches.
+
+    Requests for the same graph and operation are queued and evaluated as
+    one batch over arrays, or one by one for graphs which can not be
+    batched. With a single client connected a batch is run as soon as the
+    event loop is free, otherwise it waits up to window seconds for more
+    requests or until max_batch requests are queued.
+    """
+
+    def __init__(self, window: float = 0.002, max_batch: int = 256):
+        """Initialize service without graphs."""
+        self.window = window
+        self.max_batch = max_batch
+        self.models: Dict[str, Model] = {}
+        self.connections = 0
+        self.requests = 0
+        self.batches = 0
+        self._pending: Dict[
+            Tuple[str, str], List[Tuple[Dict[str, float], asyncio.Future]]
+        ] = defaultdict(list)
+        self._timers: Dict[Tuple[str, str], asyncio.Handle] = {}
+
+    def register(
+        self, name: str, root: Var, inputs: Sequence[Var], params: Sequence[Var] = ()
+    ):
+        """Register graph under given name."""
+        self.models[name] = Model(root, inputs, params)
+
+    async def serve(
+        self, host: str = "127.0.0.1", port: int = 0, path: Optional[str] = None
+    ) -> asyncio.AbstractServer:
+        """Start serving on a unix socket at path if given, else on host and port."""
+        if path is not None:
+            return await asyncio.start_unix_server(self._handle, path=path)
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def submit(self, graph: str, op: str, feed: Dict[str, float]) -> dict:
+        """Queue a request and return its result once its batch is evaluated."""
+        model = self.models.get(graph)
+        if model is None:
+            raise ValueError(f"unknown graph: {graph}")
+        if op not in OPERATIONS:
+            raise ValueError(f"unknown op: {op}")
+        if set(feed) != set(model.inputs):
+            raise ValueError(f"feed must have inputs: {sorted(model.inputs)}")
+        try:
+            values = {name: float(val) for name, val in feed.items()}
+        except (TypeError, ValueError) as error:
+            raise ValueError(f"feed values must be numbers: {error}") from error
+        key = (graph, op)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key].append((values, future))
+        self._schedule(key)
+        return await future
+
+    def _schedule(self, key: Tuple[str, str]):
+        """Plan evaluation of the batch queued for key."""
+        loop = asyncio.get_running_loop()
+        if len(self._pending[key]) >= self.max_batch:
+            timer = self._timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+            self._flush(key)
+        elif key not in self._timers:
+            delay = self.window if self.connections > 1 else 0.0
+            self._timers[key] = loop.call_later(delay, self._flush, key)
+
+    def _flush(self, key: Tuple[str, str]):
+        """Evaluate queued requests for key and resolve them."""
+        self._timers.pop(key, None)
+        batch = self._pending.pop(key, [])
+        if not batch:
+            return
+        self.batches += 1
+        model = self.models[key[0]]
+        groups = [batch] if model.batched else [[item] for item in batch]
+        for group in groups:
+            try:
+                if model.batched:
+                    results = _evaluate_batch(model, key[1], [req for req, _ in group])
+                else:
+                    results = [_evaluate(model, key[1], group[0][0])]
+            except Exception as error:  # pylint: disable=broad-except
+                for _, future in group:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            for (_, future), result in zip(group, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def _respond(
+        self, line: bytes, writer: asyncio.StreamWriter, lock: asyncio.Lock
+    ):
+        """Serve one request line and write its response line."""
+        ident: Any = None
+        try:
+            message = json.loads(line)
+            ident = message.get("id")
+            response = await self.submit(
+                message["graph"], message["op"], message["feed"]
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            response = {"error": str(error) or type(error).__name__}
+        response["id"] = ident
+        async with lock:
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests of one connection, several may be in flight at once."""
+        self.connections += 1
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                self.requests += 1
+                task = asyncio.create_task(self._respond(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            self.connections -= 1
+            writer.close()
@@ -0,0 +1,201 @@
+"""Flat tape representation of a graph."""
+import math
+from typing import Dict, List, Tuple, Union
+import numpy as np
+from autodiff.graph import (
+    ADD, CONST, DIV, MULT, NAN, NEG, POW, STOP, SUB, VAL, Var, close
+)
+
+TapeKey = Union[int, str, Var]
+SCALAR_OPS = (VAL, CONST, ADD, SUB, NEG, MULT, POW, DIV, STOP)
+
+
+def _log(val):
+    """Return natural logarithm where positive and nan elsewhere, elementwise."""
+    if isinstance(val, np.ndarray):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(val > 0.0, np.log(val), NAN)
+    return math.log(val, math.e) if val > 0.0 else NAN
+
+
+class Tape:  # pylint: disable=too-many-instance-attributes
+    """Graph lowered to arrays indexed by node position (a Wengert list).
+
+    Nodes are stored in depth first order, so children always come before
+    their parents and the root is the last entry. A missing child is -1.
+    Leaves may also be assigned arrays of samples, value and backward then
+    work elementwise and adjoints hold one entry per sample.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        opcodes: List[int],
+        lefts: List[int],
+        rights: List[int],
+        values: List[float],
+        names: List[str],
+    ):
+        """Initialize tape from parallel arrays."""
+        self.opcodes = opcodes
+        self.lefts = lefts
+        self.rights = rights
+        self.values = values
+        self.names = names
+        self.adjoints: List[float] = [0.0] * len(opcodes)
+        self.tangents: List[float] = [0.0] * len(opcodes)
+        # (position, opcode, left, right) of every non-leaf node in order.
+        self.steps: List[Tuple[int, int, int, int]] = [
+            step
+            for step in zip(range(len(opcodes)), opcodes, lefts, rights)
+            if step[1] not in (VAL, CONST)
+        ]
+        self.index: Dict[Var, int] = {}
+        self.name_index: Dict[str, int] = {}
+        for idx, (code, name) in enumerate(zip(opcodes, names)):
+            if code == VAL:
+                self.name_index.setdefault(name, idx)
+
+    def __getstate__(self) -> dict:
+        """Return state for pickling, without the index of Var nodes.
+
+        A tape sent to another process looks nodes up by name or position.
+        """
+        state = self.__dict__.copy()
+        state["index"] = {}
+        return state
+
+    def __len__(self) -> int:
+        """Return number of nodes on the tape."""
+        return len(self.opcodes)
+
+    def position(self, key: TapeKey) -> int:
+        """Return position of a node given as Var, leaf name or position."""
+        if isinstance(key, Var):
+            return self.index[key]
+        if isinstance(key, str):
+            return self.name_index[key]
+        return key
+
+    def assign(self, key: TapeKey, val: float):
+        """Assign value to a leaf of the tape."""
+        self.values[self.position(key)] = val
+
+    def grad(self, key: TapeKey) -> float:
+        """Get adjoint value of a node."""
+        return self.adjoints[self.position(key)]
+
+    def value(self) -> float:
+        """Evaluate all nodes and return value of the root."""
+        vals = self.values
+        for idx, code, left, right in self.steps:
+            if code == ADD:
+                vals[idx] = vals[left] + vals[right]
+            elif code == MULT:
+                vals[idx] = vals[left] * vals[right]
+            elif code == SUB:
+                vals[idx] = vals[left] - vals[right]
+            elif code == POW:
+                vals[idx] = vals[left] ** vals[right]
+            elif code == DIV:
+                vals[idx] = vals[left] / vals[right]
+            elif code == NEG:
+                vals[idx] = -vals[left]
+            elif code == STOP:
+                vals[idx] = vals[left]
+        return vals[-1]
+
+    def forward(self, wrt: TapeKey) -> float:
+        """Calculate forward gradient of the root with respect to given leaf.
+
+        This also triggers evaluation.
+        """
+        self.value()
+        vals = self.values
+        tans = self.tangents
+        tans[:] = [0.0] * len(tans)
+        tans[self.position(wrt)] = 1.0
+        for idx, code, left, right in self.steps:
+            if code == ADD:
+                tans[idx] = tans[left] + tans[right]
+            elif code == MULT:
+                tans[idx] = tans[left] * vals[right] + vals[left] * tans[right]
+            elif code == SUB:
+                tans[idx] = tans[left] - tans[right]
+            elif code == POW:
+                base, power = vals[left], vals[right]
+                tans[idx] = (
+                    power * base ** (power - 1) * tans[left]
+                ) if close(tans[right], 0.0) else (
+                    vals[idx] * (
+                        tans[right] * math.log(base, math.e)
+                        + power * tans[left] / base
+                    )
+                )
+            elif code == DIV:
+                tans[idx] = (
+                    tans[left] / vals[right]
+                    - tans[right] * vals[left] * vals[right] ** -2
+                )
+            elif code == NEG:
+                tans[idx] = -tans[left]
+        return tans[-1]
+
+    def backward(self):
+        """Calculate backward gradient of the root for every node.
+
+        This also triggers evaluation.
+        """
+        self.value()
+        vals = self.values
+        adjs = self.adjoints
+        opcodes = self.opcodes
+        adjs[:] = [0.0] * len(adjs)
+        adjs[-1] = 1.0
+        for idx, code, left, right in reversed(self.steps):
+            adj = adjs[idx]
+            if code == ADD:
+                adjs[left] += adj
+                adjs[right] += adj
+            elif code == MULT:
+                adjs[left] += adj * vals[right]
+                adjs[right] += adj * vals[left]
+            elif code == SUB:
+                adjs[left] += adj
+                adjs[right] -= adj
+            elif code == POW:
+                base, power = vals[left], vals[right]
+                adjs[left] += adj * power * base ** (power - 1)
+                if opcodes[right] != CONST:
+                    adjs[right] += adj * vals[idx] * _log(base)
+            elif code == DIV:
+                adjs[left] += adj / vals[right]
+                adjs[right] += -adj * vals[left] * vals[right] ** -2
+            elif code == NEG:
+                adjs[left] -= adj
+
+
+def compile(root: Var) -> Tape:  # pylint: disable=redefined-builtin
+    """Lower graph rooted with given node into a tape.
+
+    Current values of the leaves are copied to the tape, later updates must
+    go through Tape.assign. Only scalar operators can be lowered.
+    """
+    nodes = root.order()
+    for node in nodes:
+        if node.opcode not in SCALAR_OPS:
+            raise ValueError(f"operator {node.name} can not be put on a tape")
+    index = {node: idx for idx, node in enumerate(nodes)}
+    lefts = []
+    rights = []
+    for node in nodes:
+        lefts.append(index[node.children[0]] if node.children else -1)
+        rights.append(index[node.children[1]] if len(node.children) > 1 else -1)
+    tape = Tape(
+        [node.opcode for node in nodes],
+        lefts,
+        rights,
+        [node.eval_value for node in nodes],
+        [node.name for node in nodes],
+    )
+    tape.index = index
+    return tape
@@ -0,0 +1,51 @@
+"""Compare graph, tape and generated function on the linear regression loss."""
+import random
+import timeit
+from autodiff.codegen import generate
+from autodiff.graph import Var
+from autodiff.tape import compile as compile_tape
+
+SAMPLES = 2000
+
+w = Var("w")
+x = Var("x")
+b = Var("b")
+y = Var("y")
+l = (y - (w * x + b)) ** 2.0
+w.assign(0.1)
+b.assign(0.1)
+tape = compile_tape(l)
+func = generate(l, [w, x, b, y], [w, b])
+data = [(random.uniform(0, 10), random.uniform(0, 10)) for _ in range(SAMPLES)]  # nosec
+
+
+def graph_loop():
+    """Run value and grad on the linked graph per sample."""
+    for x_data, y_data in data:
+        x.assign(x_data)
+        y.assign(y_data)
+        l.value_and_grad([w, b])
+
+
+def tape_loop():
+    """Run backward on the tape per sample."""
+    for x_data, y_data in data:
+        tape.assign(x, x_data)
+        tape.assign(y, y_data)
+        tape.backward()
+
+
+def generated_loop():
+    """Call generated function per sample."""
+    for x_data, y_data in data:
+        func(0.1, x_data, 0.1, y_data)
+
+
+graph_time = min(timeit.repeat(graph_loop, number=1, repeat=5))
+loops = (("graph", graph_loop), ("tape", tape_loop), ("generated", generated_loop))
+for name, loop in loops:
+    elapsed = min(timeit.repeat(loop, number=1, repeat=5))
+    print(
+        f"{name:9s}: {elapsed * 1e6 / SAMPLES:6.2f} us/sample "
+        f"({graph_time / elapsed:5.1f}x)"
+    )
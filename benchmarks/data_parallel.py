@@ -0,0 +1,31 @@
+"""Throughput of data parallel gradients for growing worker counts."""
+import os
+import time
+import numpy as np
+from autodiff.graph import Var
+from autodiff.parallel import DataParallelTrainer
+
+SAMPLES = 200_000
+
+if __name__ == "__main__":
+    w = Var("w")
+    x = Var("x")
+    b = Var("b")
+    y = Var("y")
+    l = (y - (w * x + b)) ** 2.0
+    w.assign(0.1)
+    b.assign(0.1)
+    rng = np.random.default_rng(0)
+    feed = {x: rng.uniform(0, 10, SAMPLES), y: rng.uniform(0, 10, SAMPLES)}
+    l.value_and_grad([w, b], feed=feed)
+    start = time.perf_counter()
+    l.value_and_grad([w, b], feed=feed)
+    elapsed = time.perf_counter() - start
+    print(f"single process batched: {SAMPLES / elapsed:12,.0f} samples/s")
+    for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+        with DataParallelTrainer(l, [w, b], workers=workers) as trainer:
+            trainer.value_and_grad(feed)
+            start = time.perf_counter()
+            trainer.value_and_grad(feed)
+            elapsed = time.perf_counter() - start
+        print(f"workers={workers:3d}:            {SAMPLES / elapsed:12,.0f} samples/s")
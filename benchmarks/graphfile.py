@@ -0,0 +1,43 @@
+"""Compare start-up of a large graph built with operators or loaded from a file.
+
+Start-up is timed up to the first value of the root.
+"""
+import os
+import tempfile
+import timeit
+from autodiff.graph import Var
+from autodiff.graphfile import load, save
+
+NODES = 1_000_000
+
+
+def build() -> Var:
+    """Build a chain of additions and multiplications with NODES nodes."""
+    x = Var("x")
+    x.assign(0.5)
+    f = x
+    for idx in range(NODES // 3):
+        w = Var(f"w{idx}")
+        w.assign(0.001)
+        f = f * x + w
+    return f
+
+
+build_time = min(timeit.repeat(lambda: build().value(), number=1, repeat=1))
+root = build()
+with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "graph.bin")
+    save(root, path)
+    size = os.path.getsize(path)
+    map_time = min(timeit.repeat(lambda: load(path), number=1, repeat=5))
+    tape_time = min(
+        timeit.repeat(lambda: load(path).tape().value(), number=1, repeat=3)
+    )
+    graph_time = min(
+        timeit.repeat(lambda: load(path).graph().value(), number=1, repeat=1)
+    )
+print(f"nodes: {len(root.order())}, file: {size / 2 ** 20:.1f} MiB")
+print(f"build with operators, value: {build_time * 1e3:8.1f} ms")
+print(f"map file only:               {map_time * 1e3:8.3f} ms")
+print(f"load as tape, value:         {tape_time * 1e3:8.1f} ms")
+print(f"load as nodes, value:        {graph_time * 1e3:8.1f} ms")
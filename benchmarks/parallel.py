@@ -0,0 +1,39 @@
+"""Compare serial and level-scheduled parallel evaluation of a wide graph."""
+import timeit
+import numpy as np
+from autodiff.graph import Var
+from autodiff.parallel import ParallelEvaluator
+
+WIDTH = 64
+SIZE = 200_000
+
+rng = np.random.default_rng(0)
+leaves = [Var(f"x{idx}") for idx in range(WIDTH)]
+for leaf in leaves:
+    leaf.assign(rng.normal(size=SIZE))
+terms = [
+    (left * right) ** 2.0 / (left + 3.0) for left, right in zip(leaves, leaves[1:])
+]
+total = terms[0]
+for term in terms[1:]:
+    total = total + term
+
+
+def touch():
+    """Mark the whole graph dirty."""
+    for leaf in leaves:
+        leaf.mark_dirty()
+
+
+serial = min(
+    timeit.repeat("touch(); total.value()", number=1, repeat=5, globals=globals())
+)
+print(f"serial:   {serial * 1e3:7.1f} ms")
+for workers in (2, 4, 8):
+    with ParallelEvaluator(total, workers=workers, threshold=8) as evaluator:
+        elapsed = min(
+            timeit.repeat(
+                "touch(); evaluator.value()", number=1, repeat=5, globals=globals()
+            )
+        )
+    print(f"{workers} threads: {elapsed * 1e3:7.1f} ms ({serial / elapsed:.1f}x)")
@@ -0,0 +1,24 @@
+"""Time backward on wide graphs of growing size."""
+import timeit
+from autodiff.graph import Var
+
+
+def wide_graph(width: int) -> Var:
+    """Return sum of products of neighbouring leaves."""
+    leaves = [Var(f"x{idx}") for idx in range(width + 1)]
+    for idx, leaf in enumerate(leaves):
+        leaf.assign(float(idx))
+    total = leaves[0] * leaves[1]
+    for left, right in zip(leaves[1:], leaves[2:]):
+        total = total + left * right
+    return total
+
+
+for size in (1000, 2000, 4000, 8000, 16000):
+    root = wide_graph(size)
+    nodes = len(root.order())
+    elapsed = min(timeit.repeat(root.backward, number=1, repeat=3))
+    print(
+        f"width={size:6d} nodes={nodes:6d} "
+        f"backward={elapsed * 1e3:8.2f} ms ({elapsed * 1e9 / nodes:6.0f} ns/node)"
+    )
@@ -0,0 +1,40 @@
+"""Compare linked graph and tape on the linear regression backward loop."""
+import random
+import timeit
+from autodiff.graph import Var
+from autodiff.tape import compile as compile_tape
+
+SAMPLES = 2000
+
+w = Var("w")
+x = Var("x")
+b = Var("b")
+y = Var("y")
+l = (y - (w * x + b)) ** 2.0
+w.assign(0.1)
+b.assign(0.1)
+tape = compile_tape(l)
+data = [(random.uniform(0, 10), random.uniform(0, 10)) for _ in range(SAMPLES)]  # nosec
+
+
+def graph_loop():
+    """Run backward on the linked graph per sample."""
+    for x_data, y_data in data:
+        x.assign(x_data)
+        y.assign(y_data)
+        l.backward()
+
+
+def tape_loop():
+    """Run backward on the tape per sample."""
+    for x_data, y_data in data:
+        tape.assign(x, x_data)
+        tape.assign(y, y_data)
+        tape.backward()
+
+
+graph_time = min(timeit.repeat(graph_loop, number=1, repeat=5))
+tape_time = min(timeit.repeat(tape_loop, number=1, repeat=5))
+print(f"graph: {graph_time * 1e6 / SAMPLES:.2f} us/sample")
+print(f"tape:  {tape_time * 1e6 / SAMPLES:.2f} us/sample")
+print(f"speedup: {graph_time / tape_time:.1f}x")
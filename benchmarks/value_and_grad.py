@@ -0,0 +1,33 @@
+"""Compare value_and_grad with backward followed by reading value and grads."""
+import timeit
+from autodiff.graph import Var
+
+STEPS = 100_000
+
+w = Var("w")
+x = Var("x")
+b = Var("b")
+y = Var("y")
+l = (y - (w * x + b)) ** 2.0
+w.assign(0.1)
+b.assign(0.1)
+x.assign(2.0)
+y.assign(3.0)
+
+
+def separate():
+    """Run backward, then read value and grads one by one."""
+    l.backward()
+    return l.value(), {w: w.grad(), b: b.grad()}
+
+
+def combined():
+    """Run value_and_grad for the parameters."""
+    return l.value_and_grad([w, b])
+
+
+separate_time = min(timeit.repeat(separate, number=STEPS, repeat=5))
+combined_time = min(timeit.repeat(combined, number=STEPS, repeat=5))
+print(f"backward + grad: {separate_time * 1e6 / STEPS:.2f} us/step")
+print(f"value_and_grad:  {combined_time * 1e6 / STEPS:.2f} us/step")
+print(f"ratio: {combined_time / separate_time:.2f}")
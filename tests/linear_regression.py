@@ -37,16 +37,12 @@ data: List[Tuple[float, float]] \
 
 # sgd
 for epoch in range(10):
-    grads_w = 0.0
-    grads_b = 0.0
-    for x_data, y_data in random.sample(data, MINIBATCH_COUNT):
-        x.assign(x_data)
-        y.assign(y_data)
-        l.backward()
-        grads_w += w.grad()
-        grads_b += b.grad()
-    w.assign(w.value() - LEARNING_RATE * grads_w/MINIBATCH_COUNT)
-    b.assign(b.value() - LEARNING_RATE * grads_b/MINIBATCH_COUNT)
+    x_batch, y_batch = zip(*random.sample(data, MINIBATCH_COUNT))
+    _, grads = l.value_and_grad(
+        [w, b], feed={x: x_batch, y: y_batch}, reduction="mean"
+    )
+    w.assign(w.value() - LEARNING_RATE * grads[w])
+    b.assign(b.value() - LEARNING_RATE * grads[b])
     # print(f'w={w.value()} b={b.value()}')
 
 # eval
@@ -0,0 +1,84 @@
+"""Checkpoint tests."""
+import time
+import numpy as np
+import pytest
+from autodiff.checkpoint import Checkpointer, leaves, restore, save
+from autodiff.graph import Var
+
+# pylint: disable=invalid-name
+
+
+def model():
+    """Return loss of a small model and its parameters."""
+    w = Var("w")
+    b = Var("b")
+    x = Var("x", requires_grad=False)
+    l = ((w @ x).sum() + b) ** 2.0
+    return l, w, b
+
+
+def test_checkpoint_roundtrip(tmp_path):
+    """Test leaves are saved and restored, with and without mmap."""
+    l, w, b = model()
+    assert set(leaves(l)) == {w, b}
+    assert leaves(l, ["b"]) == [b]
+    w.assign(np.array([[1.0, 2.0], [3.0, 4.0]]))
+    b.assign(0.5)
+    path = str(tmp_path / "params.npy")
+    save(path, leaves(l))
+    assert np.load(path).dtype.itemsize == 5 * 8
+    w.assign(np.zeros((2, 2)))
+    b.assign(0.0)
+    restore(path, [w, b])
+    assert isinstance(w.value(), np.memmap)
+    assert np.array_equal(w.value(), [[1.0, 2.0], [3.0, 4.0]])
+    assert b.value() == 0.5
+    b.assign(0.0)
+    restore(path, [b], mmap=False)
+    assert b.value() == 0.5
+    with pytest.raises(KeyError):
+        restore(path, [Var("c")])
+    with pytest.raises(ValueError):
+        save(path, [w, Var("w")])
+
+
+def test_checkpointer(tmp_path):
+    """Test checkpoints are saved on a background thread."""
+    _, w, b = model()
+    w.assign(np.ones((2, 2)))
+    b.assign(1.0)
+    path = str(tmp_path / "params.npy")
+    with Checkpointer(path, [w, b], interval=0.01) as checkpointer:
+        deadline = time.monotonic() + 5.0
+        while checkpointer.saved == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert checkpointer.saved > 0
+        b.assign(2.0)
+    assert checkpointer.error is None
+    b.assign(0.0)
+    restore(path, [b])
+    assert b.value() == 2.0
+
+
+def test_checkpointer_error(tmp_path):
+    """Test a failed background save is raised when stopping."""
+    w = Var("w")
+    w.assign(1.0)
+    path = str(tmp_path / "missing" / "params.npy")
+    checkpointer = Checkpointer(path, [w], interval=0.01)
+    checkpointer.start()
+    deadline = time.monotonic() + 5.0
+    while checkpointer.error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(FileNotFoundError):
+        checkpointer.stop()
+
+
+def test_checkpointer_error_in_block(tmp_path):
+    """Test a failed save does not hide an error leaving the with block."""
+    w = Var("w")
+    w.assign(1.0)
+    path = str(tmp_path / "missing" / "params.npy")
+    with pytest.raises(KeyError):
+        with Checkpointer(path, [w], interval=60.0):
+            raise KeyError("training failed")
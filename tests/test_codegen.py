@@ -0,0 +1,81 @@
+"""Code generation tests."""
+import pytest
+from autodiff.graph import Var, close
+from autodiff.codegen import generate
+
+# pylint: disable=invalid-name
+
+
+def test_generate_matches_graph():
+    """Test generated function returns value and grads of the graph."""
+    x = Var("x")
+    y = Var("y")
+    z = Var("z")
+    f = (x * y - z / y) ** 2.0 + -(x * z) + x ** y
+    func = generate(f, [x, y, z], [x, y, z])
+    x.assign(3.0)
+    y.assign(5.0)
+    z.assign(11.0)
+    val, dx, dy, dz = func(3.0, 5.0, 11.0)
+    expected, grads = f.value_and_grad([x, y, z])
+    assert close(val, expected)
+    assert close(dx, grads[x])
+    assert close(dy, grads[y])
+    assert close(dz, grads[z])
+
+
+def test_generate_linear():
+    """Test generated function of the linear regression loss."""
+    w = Var("w")
+    x = Var("x")
+    b = Var("b")
+    y = Var("y")
+    l = (y - (w * x + b)) ** 2.0
+    func = generate(l, [w, x, b, y], [w, b])
+    assert func.source.startswith("def f(w, x, b, y):")
+    assert "_log" not in func.source
+    assert func(0.5, 2.0, 1.0, 3.0) == (1.0, -4.0, -2.0)
+    assert generate(l, [w, x, b, y], [w, b]) is func
+    # a changed graph is generated again
+    w.add_child(Var("c"))
+    assert generate(l, [w, x, b, y], [w, b]) is not func
+
+
+def test_generate_unsupported():
+    """Test tensor operators are rejected."""
+    a = Var("a")
+    with pytest.raises(ValueError):
+        generate(a.sum(), [a], [a])
+
+
+def test_generate_free_leaves():
+    """Test leaves not in inputs are read when called, whatever their value."""
+    w = Var("w")
+    x = Var("x")
+    b = Var("b")
+    f = w * x + b
+    b.assign(1.0)
+    func = generate(f, [w, x], [w])
+    assert func(2.0, 3.0) == (7.0, 3.0)
+    b.assign(100.0)
+    assert generate(f, [w, x], [w]) is func
+    assert func(2.0, 3.0) == (106.0, 3.0)
+    c = Var("c")
+    g = w * float("inf") + c
+    val, grad = generate(g, [w], [w])(1.0)
+    assert val != val  # c is not assigned, so nan
+    assert grad == float("inf")
+
+
+def test_generate_reserved_names():
+    """Test leaf names clashing with generated names become positional."""
+    a = Var("v0")
+    b = Var("c")
+    func = generate(a - b, [a, b], [a, b])
+    assert func.source.startswith("def f(a0, c):")
+    assert func(5.0, 1.0) == (4.0, 1.0, -1.0)
+    log = Var("_log")
+    a1 = Var("a1")
+    func = generate(log ** 2.0 * a1, [a1, log], [log])
+    assert func.source.startswith("def f(a0, a1):")
+    assert func(3.0, 2.0) == (12.0, 12.0)
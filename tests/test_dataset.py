@@ -0,0 +1,73 @@
+"""Dataset pipeline tests."""
+import numpy as np
+import pytest
+from autodiff.dataset import (
+    Prefetcher, batches, feeds, minibatches, read_csv, read_lines, shuffle
+)
+from autodiff.graph import Var
+
+# pylint: disable=invalid-name
+
+
+def test_readers(tmp_path):
+    """Test files are parsed in chunks of rows."""
+    path = tmp_path / "data.csv"
+    path.write_text("x,y\n" + "".join(f"{i},{2 * i}\n" for i in range(10)))
+    chunks = list(read_csv(str(path), chunk_size=4, header=True))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert np.array_equal(np.concatenate(chunks)[:, 1], np.arange(10) * 2.0)
+    path = tmp_path / "data.txt"
+    path.write_text("1 2 3\n\n4 5 6\n")
+    (chunk,) = read_lines(str(path))
+    assert np.array_equal(chunk, [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+
+
+def test_shuffle_and_batches():
+    """Test shuffling keeps every row and batches regroup them."""
+    chunks = [np.arange(start, start + 7.0).reshape(-1, 1) for start in (0, 7, 14)]
+    rows = np.concatenate(list(shuffle(chunks, buffer_size=5, seed=1)))
+    assert sorted(rows[:, 0]) == list(range(21))
+    assert not np.array_equal(rows[:, 0], np.arange(21))
+    sizes = [len(batch) for batch in batches(chunks, 5)]
+    assert sizes == [5, 5, 5, 5, 1]
+    assert [len(batch) for batch in batches(chunks, 5, drop_last=True)] == [5] * 4
+
+
+def test_prefetcher():
+    """Test items and errors of the source come through the prefetcher."""
+
+    def source():
+        yield 1
+        yield 2
+        raise RuntimeError("broken")
+
+    prefetcher = Prefetcher(source())
+    assert next(prefetcher) == 1
+    assert next(prefetcher) == 2
+    with pytest.raises(RuntimeError):
+        next(prefetcher)
+    prefetcher.close()
+    with Prefetcher(iter(range(100)), size=1) as prefetcher:
+        assert next(prefetcher) == 0
+
+
+def test_minibatches_train(tmp_path):
+    """Test linear regression trains on streamed minibatch feeds."""
+    w = Var("w")
+    b = Var("b")
+    x = Var("x", requires_grad=False)
+    y = Var("y", requires_grad=False)
+    l = (y - (w * x + b)) ** 2.0
+    w.assign(0.0)
+    b.assign(0.0)
+    path = tmp_path / "data.csv"
+    path.write_text("".join(f"{i / 10},{3 * i / 10 + 1}\n" for i in range(50)))
+    with pytest.raises(ValueError):
+        next(feeds([np.zeros((1, 3))], [x, y]))
+    for _ in range(200):
+        for feed in minibatches(str(path), [x, y], 10, buffer_size=20):
+            _, grads = l.value_and_grad([w, b], feed=feed, reduction="mean")
+            w.assign(w.value() - 0.05 * grads[w])
+            b.assign(b.value() - 0.05 * grads[b])
+    assert abs(w.value() - 3.0) < 0.05
+    assert abs(b.value() - 1.0) < 0.05
@@ -13,8 +13,7 @@ y.assign(random.uniform(-5.0, 5.0))  # nosec
 print(f"starting: val={f.value()}, x={x.eval_value}, y={y.eval_value}")
 LRATE = 0.1
 for itr in range(10):
-    dx = f.forward(x)
-    dy = f.forward(y)
+    dx, dy = f.forward([x, y])
     x.assign(x.value() - LRATE * dx)
     y.assign(y.value() - LRATE * dy)
     val = f.value()
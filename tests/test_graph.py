@@ -1,6 +1,11 @@
 """Graph tests."""
+import tracemalloc
 from typing import List, Set
-from autodiff.graph import Var, close
+import numpy as np
+import pytest
+from autodiff.graph import (
+    Var, close, dot, interning, literal_stats, matmul, stop_gradient
+)
 
 # pylint: disable=invalid-name
 
@@ -219,3 +224,413 @@ def test_pow():
     f.backward()
     assert dx == x.grad()
     assert dy == y.grad()
+
+
+def test_dfs_shared_node():
+    """Test shared inner node is evaluated before its parents."""
+    x = Var("x")
+    y = Var("y")
+    z = Var("z")
+    g = x * y
+    f = g + g * z
+    x.assign(2.0)
+    y.assign(3.0)
+    z.assign(5.0)
+    assert f.value() == 36.0
+
+
+def test_order_cache():
+    """Test topological order is cached and invalidated on graph change."""
+    x = Var("x")
+    y = Var("y")
+    f = x * y
+    first = f.order()
+    misses = Var.order_misses
+    hits = Var.order_hits
+    x.assign(2.0)
+    y.assign(3.0)
+    f.value()
+    f.backward()
+    assert f.order() is first
+    assert Var.order_misses == misses
+    assert Var.order_hits > hits
+    z = Var("z")
+    y.add_child(z)
+    assert f.order() is not first
+    assert Var.order_misses == misses + 1
+    assert len(f.order()) == 4
+
+
+def test_backward_shared_leaf():
+    """Test backward on graphs sharing a leaf with another graph."""
+    x = Var("x")
+    y = Var("y")
+    f = x * y
+    g = x + x
+    x.assign(3.0)
+    y.assign(5.0)
+    f.backward()
+    assert x.grad() == 5.0
+    assert y.grad() == 3.0
+    g.backward()
+    assert x.grad() == 2.0
+
+
+def test_node_size():
+    """Test memory taken by a binary operator node stays compact."""
+    x = Var("x")
+    y = Var("y")
+    count = 10000
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    f = x
+    for _ in range(count):
+        f = f * y
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    assert used / count < 300
+    assert not hasattr(f, "__dict__")
+
+
+def test_incremental_value():
+    """Test only nodes depending on assigned leaves are re-evaluated."""
+    x = Var("x")
+    y = Var("y")
+    z = Var("z")
+    xy = x * y
+    zz = z * z
+    f = xy + zz
+    x.assign(2.0)
+    y.assign(3.0)
+    z.assign(5.0)
+    assert f.value() == 31.0
+    assert not any(node.dirty for node in f.order())
+    x.assign(4.0)
+    assert x.dirty and xy.dirty and f.dirty
+    assert not zz.dirty and not y.dirty
+    # untouched subgraph keeps its value and is not recomputed
+    zz.eval_value = 100.0
+    assert f.value() == 112.0
+    assert f.value() == 112.0
+    z.assign(1.0)
+    assert f.value() == 13.0
+
+
+def test_value_and_grad():
+    """Test value and gradient are returned from a single call."""
+    x = Var("x")
+    y = Var("y")
+    z = Var("z")
+    f = (x * y) + (y * z)
+    x.assign(3.0)
+    y.assign(5.0)
+    z.assign(11.0)
+    val, grads = f.value_and_grad([x, z])
+    assert val == 70.0
+    assert grads == {x: 5.0, z: 5.0}
+    y.assign(1.0)
+    val, grads = f.value_and_grad([y])
+    assert val == 14.0
+    assert grads[y] == 14.0
+    w = Var("w")
+    v = Var("v")
+    (w * x).backward()
+    _, grads = (x * 2.0).value_and_grad([w, v])
+    assert grads == {w: 0.0, v: 0.0}
+
+
+def test_forward_vector():
+    """Test derivatives for many directions are calculated in one sweep."""
+    x = Var("x")
+    y = Var("y")
+    z = Var("z")
+    f = (x * y) + (y * z) / x - x ** 2.0
+    x.assign(3.0)
+    y.assign(5.0)
+    z.assign(11.0)
+    grads = f.forward([x, y, z])
+    assert grads.shape == (3,)
+    for grad, leaf in zip(grads, (x, y, z)):
+        assert close(grad, f.forward(leaf))
+    a = Var("a")
+    c = Var("c")
+    a.assign(np.array([1.0, 2.0]))
+    c.assign(np.array([3.0, 4.0]))
+    with pytest.raises(ValueError):
+        (a * c).sum().forward([a, c])
+
+
+def test_value_feed():
+    """Test graph is evaluated elementwise for fed arrays."""
+    w = Var("w")
+    x = Var("x")
+    b = Var("b")
+    f = (w * x + b) ** 2.0 / x
+    w.assign(3.0)
+    b.assign(2.0)
+    x.assign(1.0)
+    xs = np.array([1.0, 2.0, 4.0])
+    vals = f.value(feed={x: xs})
+    assert isinstance(vals, np.ndarray)
+    assert np.allclose(vals, (3.0 * xs + 2.0) ** 2.0 / xs)
+    assert np.allclose(f.value(feed={x: [1.0, 2.0], b: 0.0}), [9.0, 18.0])
+    assert f.value() == 25.0
+    assert x.value() == 1.0
+
+
+def test_value_and_grad_batch():
+    """Test batched gradients match a loop over samples."""
+    w = Var("w")
+    x = Var("x")
+    b = Var("b")
+    y = Var("y")
+    l = (y - (w * x + b)) ** 2.0
+    w.assign(0.5)
+    b.assign(-1.0)
+    xs = [0.0, 1.0, 2.0, 3.0]
+    ys = [1.0, 3.0, 2.0, 5.0]
+    losses = []
+    grads_w = []
+    grads_b = []
+    for x_data, y_data in zip(xs, ys):
+        x.assign(x_data)
+        y.assign(y_data)
+        l.backward()
+        losses.append(l.value())
+        grads_w.append(w.grad())
+        grads_b.append(b.grad())
+    feed = {x: xs, y: ys}
+    val, grads = l.value_and_grad([w, b], feed=feed, reduction="none")
+    assert np.allclose(val, losses)
+    assert np.allclose(grads[w], grads_w)
+    assert np.allclose(grads[b], grads_b)
+    val, grads = l.value_and_grad([w, b], feed=feed)
+    assert close(val, sum(losses))
+    assert close(grads[w], sum(grads_w))
+    val, grads = l.value_and_grad([w, b], feed=feed, reduction="mean")
+    assert close(grads[b], sum(grads_b) / len(xs))
+
+
+def test_value_and_grad_reduced_batch():
+    """Test a node reducing over the samples itself is not reduced again."""
+    w = Var("w")
+    x = Var("x", requires_grad=False)
+    y = Var("y", requires_grad=False)
+    l = ((y - x @ w) ** 2.0).mean()
+    w.assign(np.array([1.0, 2.0]))
+    xs = np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+    ys = np.array([0.0, 1.0, 1.0])
+    for reduction in ("sum", "mean"):
+        val, grads = l.value_and_grad([w], feed={x: xs, y: ys}, reduction=reduction)
+        assert close(val, 2.0)
+        assert np.allclose(grads[w], [2.0, 2.0])
+    with pytest.raises(ValueError):
+        l.value_and_grad([w], feed={x: xs, y: ys}, reduction="none")
+
+
+def numeric_grad(f: Var, leaf: Var) -> np.ndarray:
+    """Return finite difference gradient of the summed value of f."""
+    base = np.array(leaf.value(), dtype=float)
+    result = np.zeros_like(base)
+    for idx in np.ndindex(base.shape):
+        shifted = base.copy()
+        shifted[idx] += 1e-6
+        leaf.assign(shifted)
+        upper = np.sum(f.value())
+        shifted[idx] -= 2e-6
+        leaf.assign(shifted)
+        lower = np.sum(f.value())
+        result[idx] = (upper - lower) / 2e-6
+    leaf.assign(base)
+    return result
+
+
+def test_tensor():
+    """Test array valued nodes with broadcasting."""
+    w = Var("w")
+    x = Var("x")
+    b = Var("b")
+    f = (w * x + b) ** 2.0 / x - -w
+    w.assign(np.array([[1.0], [2.0], [3.0]]))
+    x.assign(np.array([1.0, 2.0, 4.0, 5.0]))
+    b.assign(0.5)
+    assert f.value().shape == (3, 4)
+    assert f.shape == (3, 4)
+    f.backward()
+    assert w.grad().shape == (3, 1)
+    assert x.grad().shape == (4,)
+    assert np.ndim(b.grad()) == 0
+    for leaf in (w, x, b):
+        assert np.allclose(leaf.grad(), numeric_grad(f, leaf), atol=1e-4)
+
+
+def test_tensor_per_sample():
+    """Test per sample gradients for an array valued parameter."""
+    w = Var("w")
+    x = Var("x")
+    f = w * x * w
+    w.assign(np.array([1.0, 2.0]))
+    xs = np.array([[1.0, 3.0], [2.0, 5.0], [0.5, 0.0]])
+    val, grads = f.value_and_grad([w], feed={x: xs}, reduction="none")
+    assert val.shape == (3, 2)
+    assert np.allclose(grads[w], 2.0 * w.value() * xs)
+    val, grads = f.value_and_grad([w], feed={x: xs})
+    assert np.allclose(grads[w], (2.0 * w.value() * xs).sum(axis=0))
+
+
+def test_matmul():
+    """Test matrix multiplication and dot product for vectors and matrices."""
+    rng = np.random.default_rng(0)
+    shapes = [
+        ((3, 4), (4, 2)),
+        ((4,), (4, 2)),
+        ((3, 4), (4,)),
+        ((4,), (4,)),
+        ((5, 3, 4), (4, 2)),
+    ]
+    for left_shape, right_shape in shapes:
+        a = Var("a")
+        b = Var("b")
+        f = matmul(a, b) * 2.0 if len(left_shape) > 1 else dot(a, b) * 2.0
+        a.assign(rng.normal(size=left_shape))
+        b.assign(rng.normal(size=right_shape))
+        assert np.allclose(f.value(), np.matmul(a.value(), b.value()) * 2.0)
+        f.backward()
+        for leaf in (a, b):
+            assert leaf.grad().shape == leaf.shape
+            assert np.allclose(leaf.grad(), numeric_grad(f, leaf), atol=1e-4)
+        assert close(np.sum(f.forward(a)), np.sum(a.grad()))
+
+
+def test_reductions():
+    """Test sum, mean and max over all elements and along an axis."""
+    rng = np.random.default_rng(1)
+    for axis in (None, 0, 1, (0, 2), -1):
+        x = Var("x")
+        f = (x.sum(axis) * 2.0 + x.mean(axis) * x.max(axis)).sum()
+        x.assign(rng.normal(size=(3, 4, 2)))
+        expected = np.sum(
+            np.sum(x.value(), axis) * 2.0
+            + np.mean(x.value(), axis) * np.max(x.value(), axis)
+        )
+        assert close(f.value(), expected)
+        f.backward()
+        assert np.allclose(x.grad(), numeric_grad(f, x), atol=1e-4)
+        assert close(f.forward(x), np.sum(x.grad()))
+
+
+def test_max_ties():
+    """Test grad of max is split between tied elements."""
+    x = Var("x")
+    f = x.max()
+    x.assign(np.array([1.0, 3.0, 3.0]))
+    f.backward()
+    assert np.allclose(x.grad(), [0.0, 0.5, 0.5])
+
+
+def test_mean_squared_error():
+    """Test mean squared error over a batch takes a few nodes."""
+    w = Var("w")
+    x = Var("x")
+    y = Var("y")
+    l = ((y - x @ w) ** 2.0).mean()
+    assert len(l.order()) == 8
+    w.assign(np.array([1.0, -1.0]))
+    x.assign(np.array([[1.0, 2.0], [3.0, 1.0], [0.0, 1.0]]))
+    y.assign(np.array([0.0, 1.0, 2.0]))
+    residual = y.value() - x.value() @ w.value()
+    assert close(l.value(), np.mean(residual ** 2.0))
+    l.backward()
+    assert np.allclose(w.grad(), -2.0 * x.value().T @ residual / 3.0)
+
+
+def test_interning():
+    """Test identical subexpressions are built once inside interning."""
+    x = Var("x")
+    y = Var("y")
+    with interning():
+        f = x * y + y * x + (x * 2.0) ** 2.0 - (x * 2.0) ** 2
+        g = x * y
+    h = x * y
+    assert len(f.order()) == 9
+    assert g in f.order()
+    assert h is not g
+    x.assign(3.0)
+    y.assign(5.0)
+    assert f.value() == 30.0
+    f.backward()
+    assert x.grad() == 10.0
+    assert y.grad() == 6.0
+
+
+def test_literal_interned():
+    """Test literal numbers share one constant node per value."""
+    x = Var("x")
+    hits = literal_stats().hits
+    f = x * 2.0 + (x - 2) ** 2.0 + x * -0.0 + x * 0.0
+    nodes = f.order()
+    assert len([node for node in nodes if node.name == "2.0"]) == 1
+    assert len([node for node in nodes if node.eval_value == 0.0]) == 2
+    assert literal_stats().hits >= hits + 2
+    assert not Var.resolve(2.0).parents
+    x.assign(3.0)
+    assert f.value() == 7.0
+    f.backward()
+    assert x.grad() == 4.0
+    # shared constants can not be changed under other graphs
+    with pytest.raises(ValueError):
+        Var.resolve(2.0).assign(5.0)
+    assert f.value() == 7.0
+
+
+def test_backward_wrt():
+    """Test reverse sweep is restricted to paths to requested nodes."""
+    w = Var("w")
+    x = Var("x")
+    b = Var("b")
+    y = Var("y")
+    xy = x * y
+    l = (y - (w * x + b)) ** 2.0 + xy
+    assert len(l.active([w, b])) == 7
+    w.assign(0.5)
+    b.assign(1.0)
+    x.assign(2.0)
+    y.assign(3.0)
+    l.backward(wrt=[w, b])
+    assert w.grad() == -4.0
+    assert b.grad() == -2.0
+    assert xy.grad() == 1.0
+    # inactive xy does not propagate to y
+    assert y.grad() == 2.0
+    l.backward()
+    assert y.grad() == 2.0 + 2.0
+    # active nodes are cached until the graph changes
+    assert l.active([w, b]) is l.active([w, b])
+    active = l.active([w, b])
+    w.add_child(Var("c"))
+    assert l.active([w, b]) is not active
+
+
+def test_requires_grad():
+    """Test data leaves and stopped subgraphs take no tangent nor adjoint."""
+    w = Var("w")
+    x = Var("x", requires_grad=False)
+    y = Var("y", requires_grad=False)
+    wx = w * x
+    xy = x * y
+    target = stop_gradient(wx * 2.0)
+    l = (wx - target) ** 2.0 + xy * w
+    assert wx.requires_grad
+    assert not xy.requires_grad
+    assert not target.requires_grad
+    w.assign(0.5)
+    x.assign(2.0)
+    y.assign(3.0)
+    assert l.value() == 4.0
+    l.backward()
+    assert w.grad() == 2.0 * (1.0 - 2.0) * 2.0 + 6.0
+    assert x.grad() == 0.0
+    assert y.grad() == 0.0
+    assert l.forward(w) == w.grad()
+    assert l.forward(x) == 0.0
+    assert np.allclose(l.forward([w, x]), [w.grad(), 0.0])
@@ -0,0 +1,64 @@
+"""Graph file tests."""
+import pytest
+from autodiff.graph import Var, close, stop_gradient
+from autodiff.graphfile import load, save
+
+# pylint: disable=invalid-name
+
+
+def test_graphfile_roundtrip(tmp_path):
+    """Test a saved graph loads with the same structure, values and grads."""
+    x = Var("x")
+    y = Var("y")
+    z = Var("z", requires_grad=False)
+    f = (x * y - z / y) ** 2.0 + -stop_gradient(x * z)
+    x.assign(3.0)
+    y.assign(5.0)
+    z.assign(11.0)
+    f.backward()
+    path = str(tmp_path / "f.graph")
+    save(f, path)
+    graph = load(path)
+    assert len(graph) == len(f.order())
+    assert graph.names() == [node.name for node in f.order()]
+    pos = graph.names().index("x")
+    assert graph.name(pos) == "x"
+    assert graph.values[pos] == 3.0
+
+    root = graph.graph()
+    assert close(root.value(), f.value())
+    root.backward()
+    for original, loaded in zip(f.order(), root.order()):
+        assert loaded.name == original.name
+        assert loaded.requires_grad == original.requires_grad
+        if original.children and original.requires_grad:
+            assert close(loaded.grad(), original.grad())
+
+    tape = graph.tape()
+    tape.backward()
+    assert close(tape.grad("x"), x.grad())
+    assert close(tape.grad("y"), y.grad())
+
+
+def test_graphfile_copy_on_write(tmp_path):
+    """Test values changed in memory are not written to the file."""
+    w = Var("w")
+    f = w * 2.0
+    w.assign(1.5)
+    path = str(tmp_path / "f.graph")
+    save(f, path)
+    graph = load(path)
+    pos = graph.names().index("w")
+    graph.values[pos] = 4.0
+    assert graph.tape().value() == 8.0
+    assert load(path).values[pos] == 1.5
+
+
+def test_graphfile_errors(tmp_path):
+    """Test invalid files and graphs are rejected."""
+    path = tmp_path / "f.graph"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        load(str(path))
+    with pytest.raises(ValueError):
+        save(Var("w").sum(), str(path))
@@ -0,0 +1,67 @@
+"""Optimization pass tests."""
+from autodiff.graph import CONST, DIV, MULT, NEG, POW, Var, close
+from autodiff.optimize import fold_constants, simplify
+
+# pylint: disable=invalid-name
+
+
+def test_fold_constants():
+    """Test constant subgraphs are folded into one constant node."""
+    x = Var("x")
+    y = Var("y")
+    f = x * (Var.resolve(2.0) * 3.0 / 4.0) + (y - x) ** 2.0
+    x.assign(3.0)
+    y.assign(5.0)
+    expected = f.value()
+    assert len(f.order()) == 11
+    assert fold_constants(f) is f
+    assert len(f.order()) == 8
+    constants = [node.eval_value for node in f.order() if node.opcode == CONST]
+    assert sorted(constants) == [1.5, 2.0]
+    assert close(f.value(), expected)
+    f.backward()
+    assert close(x.grad(), 1.5 - 4.0)
+    assert close(y.grad(), 4.0)
+    assert f.forward(x) == x.grad()
+
+
+def test_fold_constant_graph():
+    """Test a graph with only constants becomes a constant."""
+    f = -(Var.resolve(2.0) ** 3.0)
+    fold_constants(f)
+    assert f.opcode == CONST
+    assert not f.children
+    assert f.value() == -8.0
+
+
+def test_simplify():
+    """Test identities are dropped and operators strength reduced."""
+    x = Var("x")
+    y = Var("y")
+    f = (-(-(x * 1.0)) + 0.0) ** 2.0 + (y / 4.0 - 0.0) ** 3 + (x ** 1.0 + y) ** 4.0
+    x.assign(3.0)
+    y.assign(5.0)
+    expected, grads = f.value_and_grad([x, y])
+    f = simplify(fold_constants(f))
+    nodes = f.order()
+    assert not [node for node in nodes if node.opcode in (POW, DIV, NEG)]
+    assert [node.eval_value for node in nodes if node.opcode == CONST] == [0.25]
+    val, simple_grads = f.value_and_grad([x, y])
+    assert close(val, expected)
+    assert close(simple_grads[x], grads[x])
+    assert close(simple_grads[y], grads[y])
+    # dropped nodes are no longer parents of the leaves
+    assert all(parent in nodes for parent in x.parents + y.parents)
+
+
+def test_simplify_root():
+    """Test root is replaced when it is an identity."""
+    x = Var("x")
+    f = x * 1.0
+    assert simplify(f) is x
+    assert not x.parents
+    g = x ** 2.0
+    assert simplify(g) is g
+    assert g.opcode == MULT
+    assert g.children == (x, x)
+    assert x.parents.count(g) == 2
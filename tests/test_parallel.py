@@ -0,0 +1,74 @@
+"""Parallel evaluation tests."""
+import numpy as np
+import pytest
+from autodiff.graph import Var
+from autodiff.parallel import DataParallelTrainer, ParallelEvaluator, levels
+
+# pylint: disable=invalid-name
+
+
+def wide_graph(width: int):
+    """Return leaves and sum of their pairwise products."""
+    leaves = [Var(f"x{idx}") for idx in range(width)]
+    total = leaves[0] * leaves[1]
+    for left, right in zip(leaves[1:], leaves[2:]):
+        total = total + left * right
+    return leaves, total
+
+
+def test_levels():
+    """Test nodes of a level only depend on lower levels."""
+    _, f = wide_graph(6)
+    groups = levels(f)
+    assert sum(len(group) for group in groups) == len(f.order())
+    assert len(groups[1]) == 5
+    seen = set()
+    for group in groups:
+        for node in group:
+            assert all(child in seen for child in node.children)
+        seen.update(group)
+
+
+def test_parallel_value():
+    """Test parallel evaluation matches serial evaluation."""
+    rng = np.random.default_rng(0)
+    leaves, f = wide_graph(50)
+    for leaf in leaves:
+        leaf.assign(rng.normal(size=100))
+    with ParallelEvaluator(f, workers=4, threshold=2) as evaluator:
+        result = evaluator.value()
+        assert not f.dirty
+        assert evaluator.value() is result
+        leaves[3].assign(rng.normal(size=100))
+        result = evaluator.value()
+    expected = sum(
+        left.value() * right.value() for left, right in zip(leaves, leaves[1:])
+    )
+    assert np.allclose(result, expected)
+
+
+def test_data_parallel():
+    """Test grads from worker processes match batched grads of the graph."""
+    w = Var("w")
+    x = Var("x")
+    b = Var("b")
+    y = Var("y")
+    l = (y - (w * x + b)) ** 2.0
+    w.assign(0.5)
+    b.assign(-1.0)
+    xs = np.arange(10.0)
+    ys = np.array([1, 3, 2, 5, 7, 8, 8, 9, 10, 12], dtype=float)
+    expected, expected_grads = l.value_and_grad(
+        [w, b], feed={x: xs, y: ys}, reduction="mean"
+    )
+    with DataParallelTrainer(l, [w, b], workers=3) as trainer:
+        loss, grads = trainer.value_and_grad({x: xs, y: ys}, reduction="mean")
+        assert np.isclose(loss, expected)
+        assert np.isclose(grads[w], expected_grads[w])
+        assert np.isclose(grads[b], expected_grads[b])
+        w.assign(1.0)
+        _, grads = trainer.value_and_grad({x: xs, y: ys})
+        _, expected_grads = l.value_and_grad([w, b], feed={x: xs, y: ys})
+        assert np.isclose(grads[w], expected_grads[w])
+    with pytest.raises(ValueError):
+        DataParallelTrainer(l, [])
@@ -0,0 +1,122 @@
+"""Evaluation service tests."""
+import asyncio
+import json
+from autodiff.graph import Var
+from autodiff.service import EvalService
+
+# pylint: disable=invalid-name
+
+
+def linear_service() -> EvalService:
+    """Return service serving the linear regression loss."""
+    w = Var("w")
+    x = Var("x")
+    b = Var("b")
+    y = Var("y")
+    l = (y - (w * x + b)) ** 2.0
+    w.assign(0.5)
+    b.assign(1.0)
+    service = EvalService(window=0.05)
+    service.register("linear", l, [x, y], [w, b])
+    return service
+
+
+async def call(port: int, requests: list) -> list:
+    """Send requests on one connection and return responses by id."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for request in requests:
+        writer.write(json.dumps(request).encode() + b"\n")
+    await writer.drain()
+    responses = [json.loads(await reader.readline()) for _ in requests]
+    writer.close()
+    return sorted(responses, key=lambda response: response["id"])
+
+
+def test_service_single():
+    """Test a single caller is served right away."""
+
+    async def run():
+        service = linear_service()
+        server = await service.serve()
+        port = server.sockets[0].getsockname()[1]
+        request = {
+            "id": 1, "graph": "linear", "op": "grad", "feed": {"x": 2.0, "y": 3.0}
+        }
+        response, = await call(port, [request])
+        assert response == {"id": 1, "value": 1.0, "grads": {"w": -4.0, "b": -2.0}}
+        response, = await call(port, [dict(request, op="value", id=2)])
+        assert response == {"id": 2, "value": 1.0}
+        response, = await call(port, [dict(request, feed={"x": 1.0}, id=3)])
+        assert "error" in response
+        bad = dict(request, feed={"x": "abc", "y": 3.0}, id=4)
+        responses = await call(port, [bad, dict(request, id=5)])
+        assert "error" in responses[0]
+        assert responses[1]["value"] == 1.0
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
+
+
+def test_service_batches():
+    """Test concurrent requests are evaluated in batches."""
+
+    async def run():
+        service = linear_service()
+        server = await service.serve()
+        port = server.sockets[0].getsockname()[1]
+        requests = [
+            [
+                {
+                    "id": idx,
+                    "graph": "linear",
+                    "op": "grad",
+                    "feed": {"x": float(idx), "y": float(client)},
+                }
+                for idx in range(5)
+            ]
+            for client in range(4)
+        ]
+        results = await asyncio.gather(*(call(port, batch) for batch in requests))
+        for client, responses in enumerate(results):
+            for idx, response in enumerate(responses):
+                residual = client - (0.5 * idx + 1.0)
+                assert response["value"] == residual ** 2.0
+                assert response["grads"]["w"] == -2.0 * residual * idx
+        assert service.requests == 20
+        assert service.batches < 20
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
+
+
+def test_service_reducing_graph():
+    """Test concurrent requests to a reducing graph are not mixed."""
+
+    async def run():
+        w = Var("w")
+        x = Var("x")
+        f = (w * x).sum()
+        w.assign(2.0)
+        service = EvalService(window=0.05)
+        service.register("sum", f, [x], [w])
+        server = await service.serve()
+        port = server.sockets[0].getsockname()[1]
+        results = await asyncio.gather(
+            *(
+                call(port, [{"id": idx, "graph": "sum", "op": op, "feed": {"x": idx}}])
+                for idx in (1.0, 2.0, 3.0)
+                for op in ("value", "grad")
+            )
+        )
+        for (response,), (idx, op) in zip(
+            results, [(idx, op) for idx in (1.0, 2.0, 3.0) for op in ("value", "grad")]
+        ):
+            assert response["value"] == 2.0 * idx
+            if op == "grad":
+                assert response["grads"] == {"w": idx}
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())